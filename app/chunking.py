@@ -1,93 +1,119 @@
 from __future__ import annotations
 
+import functools
 import math
+import multiprocessing as mp
 import re
-from typing import Iterable, List
+from itertools import accumulate
+from typing import Callable, Iterable, Iterator, List, Sequence, Tuple
+
+try:
+    import tiktoken  # type: ignore
+except ImportError:  # pragma: no cover - 仅在按 token 分块时需要
+    tiktoken = None  # type: ignore
+
+try:
+    import numba  # type: ignore
+    import numpy as np
+except ImportError:  # pragma: no cover - 未安装时使用纯 Python 实现
+    numba = None  # type: ignore
 
 from .types import DocumentChunk, RawDocument
 
-SENTENCE_SEP_PATTERN = re.compile(r"(?<=[。！？?!])")
+# 单次扫描同时匹配句子主体与结尾标点，末尾无标点的残句单独匹配
+SENTENCE_RE = re.compile(r"[^。！？?!]*[。！？?!]|[^。！？?!]+\Z")
 
 
 def _split_sentences(text: str) -> List[str]:
     """基于中文标点对文本进行粗粒度分句。"""
-    sentences: List[str] = []
-    buffer = ""
-    for part in SENTENCE_SEP_PATTERN.split(text):
-        if not part.strip():
-            continue
-        buffer += part
-        if SENTENCE_SEP_PATTERN.search(part):
-            sentences.append(buffer.strip())
-            buffer = ""
-    if buffer.strip():
-        sentences.append(buffer.strip())
+    # map(str.strip) 在 C 层完成裁剪，每个片段只 strip 一次
+    sentences = [s for s in map(str.strip, SENTENCE_RE.findall(text)) if s]
     return sentences or [text]
 
 
+@functools.lru_cache(maxsize=1)
+def _token_encoding():
+    """加载并缓存 tiktoken 编码器。"""
+    if tiktoken is None:
+        raise ImportError("按 token 分块需要安装 tiktoken。请执行 `pip install tiktoken`。")
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def _token_length(sentence: str) -> int:
+    """返回句子的 token 数。"""
+    return len(_token_encoding().encode_ordinary(sentence))
+
+
+def _length_function(length_unit: str) -> Callable[[str], int]:
+    """根据计量单位返回句子长度函数（char 或 token）。"""
+    if length_unit == "char":
+        return len
+    if length_unit == "token":
+        return _token_length
+    raise ValueError(f"Unsupported chunk length unit: {length_unit}")
+
+
+def _plan_chunks(
+    lens: Sequence[int], chunk_size: int, overlap: int
+) -> List[Tuple[int, int]]:
+    """根据句子长度规划滑动窗口，返回每个分块的 [起始句, 结束句) 区间。"""
+    plan = []
+    first = 0
+    current = 0
+    for idx in range(len(lens)):
+        size = lens[idx]
+        if current + size > chunk_size and idx > first:
+            plan.append((first, idx))
+            while first < idx and current > overlap:
+                current -= lens[first]
+                first += 1
+        current += size
+    if len(lens) > first:
+        plan.append((first, len(lens)))
+    return plan
+
+
+if numba is not None:
+    _plan_chunks = numba.njit(cache=True)(_plan_chunks)
+
+
 def chunk_document(
     document: RawDocument,
     *,
     chunk_size: int,
     overlap: int,
+    length_unit: str = "char",
 ) -> List[DocumentChunk]:
-    """对单个文档执行滑动窗口分块，并保留重叠区域。"""
+    """对单个文档执行滑动窗口分块，并保留重叠区域。
+
+    ``chunk_size`` 与 ``overlap`` 的单位由 ``length_unit`` 决定，
+    ``start_index``/``end_index`` 始终为字符偏移。
+    """
 
     sentences = _split_sentences(document.text)
     if not sentences:
         return []
+    length_of = _length_function(length_unit)
 
-    chunks: List[DocumentChunk] = []
-    text_cursor = 0
-    chunk_index = 0
-
-    current_chunk: List[str] = []
-    current_length = 0
-
-    for sentence in sentences:
-        sentence_length = len(sentence)
-        if current_length + sentence_length > chunk_size and current_chunk:
-            chunk_text = "".join(current_chunk).strip()
-            start = max(0, text_cursor - current_length)
-            end = start + len(chunk_text)
-            chunk_id = f"{document.doc_id}_{chunk_index:05d}"
-            chunks.append(
-                DocumentChunk(
-                    doc_id=document.doc_id,
-                    chunk_id=chunk_id,
-                    text=chunk_text,
-                    start_index=start,
-                    end_index=end,
-                    metadata={
-                        **document.metadata,
-                        "chunk_index": chunk_index,
-                    },
-                )
-            )
+    sizes = [length_of(sentence) for sentence in sentences]
+    if numba is not None:
+        lens = np.fromiter(sizes, dtype=np.int32, count=len(sizes))
+    else:
+        lens = sizes
+    # 偏移量按字符累计，与计量单位无关
+    offsets = [0, *accumulate(map(len, sentences))]
 
-            chunk_index += 1
-            overlap_chars = 0
-            while current_chunk and current_length > overlap:
-                removed = current_chunk.pop(0)
-                current_length -= len(removed)
-            current_length = sum(len(s) for s in current_chunk)
-
-        current_chunk.append(sentence)
-        current_length += sentence_length
-        text_cursor += sentence_length
-
-    if current_chunk:
-        chunk_text = "".join(current_chunk).strip()
-        start = max(0, text_cursor - current_length)
-        end = start + len(chunk_text)
-        chunk_id = f"{document.doc_id}_{chunk_index:05d}"
+    chunks: List[DocumentChunk] = []
+    for chunk_index, (first, last) in enumerate(_plan_chunks(lens, chunk_size, overlap)):
+        chunk_text = "".join(sentences[first:last]).strip()
+        start = offsets[first]
         chunks.append(
             DocumentChunk(
                 doc_id=document.doc_id,
-                chunk_id=chunk_id,
+                chunk_id=f"{document.doc_id}_{chunk_index:05d}",
                 text=chunk_text,
                 start_index=start,
-                end_index=end,
+                end_index=start + len(chunk_text),
                 metadata={
                     **document.metadata,
                     "chunk_index": chunk_index,
@@ -98,20 +124,51 @@ def chunk_document(
     return chunks
 
 
+def iter_chunks(
+    documents: Iterable[RawDocument],
+    *,
+    chunk_size: int,
+    overlap: int,
+    length_unit: str = "char",
+    workers: int = 1,
+) -> Iterator[DocumentChunk]:
+    """逐个产出语料库的分块，避免一次性在内存中保存全部结果。
+
+    ``workers`` 大于 1 时按文档并行分块，产出顺序与串行一致。
+    """
+
+    chunker = functools.partial(
+        chunk_document,
+        chunk_size=chunk_size,
+        overlap=overlap,
+        length_unit=length_unit,
+    )
+    if workers > 1:
+        with mp.Pool(workers) as pool:
+            for document_chunks in pool.imap(chunker, documents, chunksize=4):
+                yield from document_chunks
+        return
+
+    for document in documents:
+        yield from chunker(document)
+
+
 def chunk_corpus(
     documents: Iterable[RawDocument],
     *,
     chunk_size: int,
     overlap: int,
+    length_unit: str = "char",
+    workers: int = 1,
 ) -> List[DocumentChunk]:
     """遍历整个语料库，返回全部分块结果。"""
 
-    all_chunks: List[DocumentChunk] = []
-    for document in documents:
-        document_chunks = chunk_document(
-            document,
+    return list(
+        iter_chunks(
+            documents,
             chunk_size=chunk_size,
             overlap=overlap,
+            length_unit=length_unit,
+            workers=workers,
         )
-        all_chunks.extend(document_chunks)
-    return all_chunks
+    )
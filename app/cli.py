@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+import importlib.util
 import json
 from pathlib import Path
 from typing import Optional
@@ -10,6 +11,11 @@ import uvicorn
 from rich.console import Console
 from rich.table import Table
 
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - 未安装时回退到标准库
+    orjson = None  # type: ignore
+
 from .config import load_settings
 from .pipeline import RAGPipeline
 
@@ -17,13 +23,22 @@ app = typer.Typer(help="RAG QA Pipeline CLI")
 console = Console()
 
 
+def _dump_report(report: dict) -> bytes:
+    """将评估报告序列化为带缩进的 UTF-8 JSON。"""
+    if orjson is not None:
+        return orjson.dumps(report, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(report, ensure_ascii=False, indent=2).encode("utf-8")
+
+
 @app.command()
-def ingest() -> None:
+def ingest(
+    workers: int = typer.Option(1, "--workers", help="文档解析与分块的并行进程数"),
+) -> None:
     """从文档构建向量索引。"""
 
     settings = load_settings()
     pipeline = RAGPipeline(settings)
-    pipeline.ingest()
+    pipeline.ingest(workers=workers)
     console.print("[green]索引构建完成[/green]")
 
 
@@ -63,7 +78,10 @@ def serve(
 ) -> None:
     """启动 FastAPI 服务。"""
 
-    uvicorn.run("app.server:app", host=host, port=port, reload=False)
+    # uvloop 不支持 Windows，缺失时回退到 asyncio 事件循环与 h11 解析器
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    uvicorn.run("app.server:app", host=host, port=port, reload=False, loop=loop, http=http)
 
 
 @app.command()
@@ -84,10 +102,12 @@ def evaluate(
         evaluate_dataset(pipeline=pipeline, dataset_path=dataset_path, limit=limit)
     )
 
-    console.print_json(data=report)
+    data = _dump_report(report)
+    # 直接输出已序列化的文本，避免 rich 再次解析整份报告
+    console.out(data.decode("utf-8"), highlight=False)
 
     if output_path:
-        output_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), "utf-8")
+        output_path.write_bytes(data)
         console.print(f"[green]评估结果已保存至 {output_path}[/green]")
 
 
@@ -26,20 +26,32 @@ class Settings:
     store_doc_path: Path
     embedding_cache_path: Path
     metrics_db_path: Path
+    metrics_retention_rows: int
     api_key: Optional[str]
     llm_base_url: str
     llm_model: str
     embedding_model: str
+    embed_batch_size: Optional[int]
+    embed_onnx: bool
+    embed_quantize: bool
     chunk_size: int
     chunk_overlap: int
+    chunk_unit: str
     top_k: int
     rerank_top_k: int
+    faiss_index_type: str
+    faiss_ef_search: int
+    faiss_mmap: bool
+    faiss_metric: str
+    retrieval_cache_size: int
+    retrieval_cache_similarity: float
     reranker_name: str
     reranker_model: str
     eval_api_key: Optional[str]
     eval_llm_base_url: Optional[str]
     eval_llm_model: Optional[str]
     eval_embedding_model: Optional[str]
+    eval_concurrency: int
 
 
 def load_settings() -> Settings:
@@ -79,22 +91,35 @@ def load_settings() -> Settings:
         index_path=storage_dir / os.getenv("INDEX_FILENAME", "vector_index.faiss"),
         store_doc_path=storage_dir / os.getenv("METADATA_FILENAME", "chunks.jsonl"),
         embedding_cache_path=storage_dir
-        / os.getenv("EMBED_CACHE_FILENAME", "embedding_cache.pkl"),
+        / os.getenv("EMBED_CACHE_FILENAME", "embedding_cache.sqlite"),
         metrics_db_path=storage_dir / os.getenv("METRICS_DB_FILENAME", "metrics.db"),
+        metrics_retention_rows=int(os.getenv("METRICS_RETENTION_ROWS", "1000000")),
         api_key=api_key,
         llm_base_url=os.getenv(
             "LLM_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1"
         ),
         llm_model=os.getenv("LLM_MODEL", "qwen3-14b"),
         embedding_model=os.getenv("EMBEDDING_MODEL", "BAAI/bge-large-zh-v1.5"),
+        # 未设置时由 EmbeddingService 按设备自动选择（GPU 64 / CPU 16）
+        embed_batch_size=int(os.getenv("EMBED_BATCH_SIZE", "0")) or None,
+        embed_onnx=os.getenv("EMBED_ONNX", "1").lower() not in {"0", "false", "no"},
+        embed_quantize=os.getenv("EMBED_QUANTIZE", "0").lower() in {"1", "true", "yes"},
         chunk_size=int(os.getenv("CHUNK_SIZE", "400")),
         chunk_overlap=int(os.getenv("CHUNK_OVERLAP", "80")),
+        chunk_unit=os.getenv("CHUNK_UNIT", "char").lower(),
         top_k=int(os.getenv("TOP_K", "5")),
         rerank_top_k=int(os.getenv("RERANK_TOP_K", "12")),
+        faiss_index_type=os.getenv("FAISS_INDEX_TYPE", "flat").lower(),
+        faiss_ef_search=int(os.getenv("FAISS_EF_SEARCH", "64")),
+        faiss_mmap=os.getenv("FAISS_MMAP", "0").lower() in {"1", "true", "yes"},
+        faiss_metric=os.getenv("FAISS_METRIC", "l2").lower(),
+        retrieval_cache_size=int(os.getenv("RETRIEVAL_CACHE_SIZE", "512")),
+        retrieval_cache_similarity=float(os.getenv("RETRIEVAL_CACHE_SIMILARITY", "1.1")),
         reranker_name=os.getenv("RERANKER", "none"),
         reranker_model=os.getenv("RERANKER_MODEL", "colbert-ir/colbertv2.0"),
         eval_api_key=eval_api_key,
         eval_llm_base_url=eval_llm_base_url,
         eval_llm_model=eval_llm_model,
         eval_embedding_model=eval_embedding_model,
+        eval_concurrency=int(os.getenv("EVAL_CONCURRENCY", "8")),
     )
@@ -1,9 +1,13 @@
 from __future__ import annotations
 
+import hashlib
+import io
 import json
+import multiprocessing as mp
+import os
 import uuid
 from pathlib import Path
-from typing import Iterable, List
+from typing import Dict, Iterable, List, Optional
 
 try:
     from pypdf import PdfReader  # type: ignore
@@ -13,6 +17,17 @@ except ImportError:  # pragma: no cover - 兼容旧版本库
     except ImportError:
         PdfReader = None  # type: ignore
 
+# 可选的 C/C++ 后端，速度远高于纯 Python 的 pypdf
+try:
+    import pypdfium2 as pdfium  # type: ignore
+except ImportError:  # pragma: no cover - 可选依赖
+    pdfium = None  # type: ignore
+
+try:
+    import fitz  # type: ignore  # PyMuPDF
+except ImportError:  # pragma: no cover - 可选依赖
+    fitz = None  # type: ignore
+
 from .logger import get_logger
 from .types import RawDocument
 
@@ -42,16 +57,53 @@ def _read_docx_file(path: Path) -> str:
         return "\n".join(paragraph.text for paragraph in document.paragraphs)
 
 
+def _read_pdf_pdfium(path: Path) -> str:
+    """使用 PDFium 逐页提取文本。"""
+    buffer = io.StringIO()
+    pdf = pdfium.PdfDocument(str(path))
+    try:
+        for index, page in enumerate(pdf):
+            if index:
+                buffer.write("\n")
+            textpage = page.get_textpage()
+            # PDFium 以 CRLF 分行，统一为 LF 与其他后端保持一致
+            buffer.write(textpage.get_text_range().replace("\r\n", "\n"))
+            textpage.close()
+            page.close()
+    finally:
+        pdf.close()
+    return buffer.getvalue()
+
+
+def _read_pdf_pymupdf(path: Path) -> str:
+    """使用 PyMuPDF 逐页提取文本。"""
+    buffer = io.StringIO()
+    with fitz.open(str(path)) as pdf:
+        for index, page in enumerate(pdf):
+            if index:
+                buffer.write("\n")
+            buffer.write(page.get_text())
+    return buffer.getvalue()
+
+
 def _read_pdf_file(path: Path) -> str:
-    """使用 pypdf 提取 PDF 页面的全部文本。"""
+    """提取 PDF 全部文本，依次尝试 pypdfium2、PyMuPDF 与 pypdf。"""
+    if pdfium is not None:
+        return _read_pdf_pdfium(path)
+    if fitz is not None:
+        return _read_pdf_pymupdf(path)
     if PdfReader is None:
         raise ImportError(
-            "读取 .pdf 文件需要安装 pypdf 或 PyPDF2。请执行 `pip install pypdf`。"
+            "读取 .pdf 文件需要安装 pypdfium2、PyMuPDF 或 pypdf。请执行 `pip install pypdfium2`。"
         )
 
     reader = PdfReader(str(path))
-    pages = [page.extract_text() or "" for page in reader.pages]
-    return "\n".join(pages)
+    buffer = io.StringIO()
+    for index, page in enumerate(reader.pages):
+        if index:
+            buffer.write("\n")
+        buffer.write(page.extract_text() or "")
+    return buffer.getvalue()
 
 
 READERS = {
@@ -62,43 +114,150 @@ READERS = {
 }
 
 
-def load_documents(document_dir: Path) -> List[RawDocument]:
-    """读取目录中的所有合法文档，转换为 RawDocument 列表。"""
+MANIFEST_FILENAME = "ingest_manifest.json"
+RAW_TEXT_DIRNAME = "raw_text"
 
-    documents: List[RawDocument] = []
-    for path in sorted(document_dir.glob("**/*")):
-        if not path.is_file():
-            continue
 
-        # 根据后缀匹配对应的解析器
-        reader = READERS.get(path.suffix.lower())
-        if not reader:
-            logger.warning("Skipping unsupported file type: %s", path)
-            continue
+def _build_document(path: Path, text: str) -> RawDocument:
+    """根据文件路径与正文构造 RawDocument。"""
 
-        try:
-            text = reader(path)
-        except Exception as exc:
-            logger.error("Failed to read %s: %s", path, exc)
-            continue
-
-        # 基于文件路径生成可复现的 doc_id
-        doc_id = uuid.uuid5(uuid.NAMESPACE_URL, str(path.resolve())).hex
-        metadata = {
-            "source_name": path.name,
-            "source_path": str(path),
-            "file_extension": path.suffix.lower(),
-        }
-
-        documents.append(
-            RawDocument(
-                doc_id=doc_id,
-                text=text,
-                source_path=str(path),
-                metadata=metadata,
-            )
+    # 基于文件路径生成可复现的 doc_id
+    doc_id = uuid.uuid5(uuid.NAMESPACE_URL, str(path.resolve())).hex
+    metadata = {
+        "source_name": path.name,
+        "source_path": str(path),
+        "file_extension": path.suffix.lower(),
+    }
+
+    return RawDocument(
+        doc_id=doc_id,
+        text=text,
+        source_path=str(path),
+        metadata=metadata,
+    )
+
+
+def _load_one(path: Path) -> Optional[RawDocument]:
+    """解析单个文件，无法处理时返回 None。"""
+
+    # 根据后缀匹配对应的解析器
+    reader = READERS.get(path.suffix.lower())
+    if not reader:
+        logger.warning("Skipping unsupported file type: %s", path)
+        return None
+
+    try:
+        text = reader(path)
+    except Exception as exc:
+        logger.error("Failed to read %s: %s", path, exc)
+        return None
+
+    return _build_document(path, text)
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _load_manifest(manifest_path: Path) -> Dict[str, Dict]:
+    """读取增量解析清单，文件缺失或损坏时返回空清单。"""
+    if not manifest_path.exists():
+        return {}
+    try:
+        data = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as exc:
+        logger.warning("Ignoring unreadable ingest manifest %s: %s", manifest_path, exc)
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _read_cached_text(text_dir: Path, entry: Dict) -> Optional[str]:
+    """读取缓存的正文，并用哈希校验其完整性。"""
+    try:
+        text = (text_dir / f"{entry['doc_id']}.txt").read_text(encoding="utf-8")
+    except (OSError, KeyError):
+        return None
+    return text if _text_hash(text) == entry.get("text_hash") else None
+
+
+def load_documents(
+    document_dir: Path,
+    *,
+    workers: int = 1,
+    cache_dir: Optional[Path] = None,
+) -> List[RawDocument]:
+    """读取目录中的所有合法文档，转换为 RawDocument 列表。
+
+    ``workers`` 大于 1 时使用进程池并行解析文件，结果顺序与串行一致。
+    指定 ``cache_dir`` 后按 mtime 与大小跳过未变化文件的解析。
+    """
+
+    paths = [path for path in sorted(document_dir.glob("**/*")) if path.is_file()]
+    loaded: List[Optional[RawDocument]] = [None] * len(paths)
+
+    manifest: Dict[str, Dict] = {}
+    stats: Dict[int, os.stat_result] = {}
+    text_dir: Optional[Path] = None
+    pending = list(range(len(paths)))
+    if cache_dir is not None:
+        manifest = _load_manifest(cache_dir / MANIFEST_FILENAME)
+        text_dir = cache_dir / RAW_TEXT_DIRNAME
+        pending = []
+        for idx, path in enumerate(paths):
+            stat = stats[idx] = path.stat()
+            entry = manifest.get(str(path.resolve()))
+            text = None
+            if (
+                entry
+                and entry.get("mtime_ns") == stat.st_mtime_ns
+                and entry.get("size") == stat.st_size
+            ):
+                text = _read_cached_text(text_dir, entry)
+            if text is None:
+                pending.append(idx)
+            else:
+                loaded[idx] = _build_document(path, text)
+        logger.info(
+            "Ingest manifest: %s unchanged, %s to parse",
+            len(paths) - len(pending),
+            len(pending),
         )
 
+    pending_paths = [paths[idx] for idx in pending]
+    if workers > 1 and len(pending_paths) > 1:
+        with mp.Pool(workers) as pool:
+            parsed = list(pool.imap(_load_one, pending_paths, chunksize=4))
+    else:
+        parsed = [_load_one(path) for path in pending_paths]
+    for idx, doc in zip(pending, parsed):
+        loaded[idx] = doc
+
+    if cache_dir is not None and text_dir is not None:
+        text_dir.mkdir(parents=True, exist_ok=True)
+        parsed_indices = set(pending)
+        new_manifest: Dict[str, Dict] = {}
+        for idx, (path, doc) in enumerate(zip(paths, loaded)):
+            if doc is None:
+                continue
+            key = str(path.resolve())
+            if idx in parsed_indices:
+                entry = {
+                    "mtime_ns": stats[idx].st_mtime_ns,
+                    "size": stats[idx].st_size,
+                    "doc_id": doc.doc_id,
+                    "text_hash": _text_hash(doc.text),
+                }
+                (text_dir / f"{doc.doc_id}.txt").write_text(doc.text, encoding="utf-8")
+            else:
+                entry = manifest[key]
+            new_manifest[key] = entry
+        manifest_path = cache_dir / MANIFEST_FILENAME
+        tmp_path = manifest_path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(new_manifest, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, manifest_path)
+
+    documents: List[RawDocument] = [doc for doc in loaded if doc is not None]
+
     # ✅ 新增：智能提示逻辑
     num_docs = len(documents)
     if num_docs == 0:
@@ -1,9 +1,11 @@
 from __future__ import annotations
+import atexit
+import functools
 import hashlib
-import pickle
+import sqlite3
 import threading
 from pathlib import Path
-from typing import Iterable, List, Sequence
+from typing import Dict, Iterable, List, Sequence
 
 import numpy as np
 import torch
@@ -13,20 +15,84 @@ from .logger import get_logger
 
 logger = get_logger(__name__)
 
+# SQLite 数据库文件的固定文件头，用于识别旧版 pickle 缓存
+_SQLITE_HEADER = b"SQLite format 3\x00"
+
+
+class _OnnxEmbedder:
+    """ONNX Runtime 推理包装，对外暴露与 FlagEmbedding 一致的 encode 接口。"""
+
+    def __init__(self, model_name: str, export_dir: Path):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        model_dir = Path(model_name)
+        kwargs: dict = {"provider": "CPUExecutionProvider"}
+        if not (model_dir.is_dir() and any(model_dir.glob("*.onnx"))):
+            # 原始检查点只在首次使用时导出，结果保存到 export_dir 供后续进程直接加载
+            model_dir = export_dir
+        if (model_dir / "model_quantized.onnx").exists():
+            # 已导出的目录：优先使用 optimum-cli 量化后的模型
+            kwargs["file_name"] = "model_quantized.onnx"
+        if model_dir.is_dir() and any(model_dir.glob("*.onnx")):
+            self._tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+            self._model = ORTModelForFeatureExtraction.from_pretrained(str(model_dir), **kwargs)
+            return
+
+        logger.info("Exporting %s to ONNX at %s", model_name, export_dir)
+        self._tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self._model = ORTModelForFeatureExtraction.from_pretrained(
+            model_name, export=True, **kwargs
+        )
+        export_dir.mkdir(parents=True, exist_ok=True)
+        self._model.save_pretrained(str(export_dir))
+        self._tokenizer.save_pretrained(str(export_dir))
+
+    def encode(
+        self, texts: Sequence[str], batch_size: int = 16, max_length: int = 512
+    ) -> np.ndarray:
+        outputs: List[np.ndarray] = []
+        for start in range(0, len(texts), batch_size):
+            inputs = self._tokenizer(
+                list(texts[start : start + batch_size]),
+                padding=True,
+                truncation=True,
+                max_length=max_length,
+                return_tensors="pt",
+            )
+            # BGE 使用 CLS 向量并做 L2 归一化，与 FlagEmbedding 输出保持一致
+            cls = self._model(**inputs).last_hidden_state[:, 0]
+            outputs.append(torch.nn.functional.normalize(cls, dim=-1).numpy())
+        return np.concatenate(outputs, axis=0)
+
 
 class EmbeddingService:
-    """FlagEmbedding 包装器，内置简单磁盘缓存以提升复用效率。"""
+    """FlagEmbedding 包装器，内置 SQLite 磁盘缓存以提升复用效率。"""
 
     def __init__(self, settings: Settings):
         self.settings = settings
         self._model = None
         self._device = "cuda" if torch.cuda.is_available() else "cpu"
+        self._batch_size = settings.embed_batch_size or (
+            64 if self._device == "cuda" else 16
+        )
         self._model_lock = threading.Lock()
         self._cache_path = settings.embedding_cache_path
-        self._cache: dict[str, np.ndarray] = {}
-        self._cache_dirty = False
+        # int8 与 float16 两种编码分表存放，切换配置时不会读到另一种格式
+        self._quantize = settings.embed_quantize
+        self._cache_table = "embeddings_q8" if self._quantize else "embeddings"
         self._cache_lock = threading.Lock()
-        self._load_cache()
+        self._cache_conn = self._init_cache()
+        # 新向量先进入待写缓冲，由后台线程合并落盘，编码路径不再等待磁盘
+        self._pending: Dict[bytes, np.ndarray] = {}
+        self._pending_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._closed = False
+        self._flush_thread = threading.Thread(
+            target=self._flush_loop, name="embedding-cache-flush", daemon=True
+        )
+        self._flush_thread.start()
+        atexit.register(self.close)
 
     def _load_model(self):
         """懒加载 embedding 模型，线程安全。"""
@@ -38,6 +104,24 @@ class EmbeddingService:
             if self._model is not None:
                 return
 
+            if self._device == "cpu" and self.settings.embed_onnx:
+                # 模型名可能是 Hub 名称或本地路径，非法字符统一替换后作为目录名
+                dirname = "".join(
+                    ch if ch.isalnum() or ch in "._-" else "-"
+                    for ch in self.settings.embedding_model
+                )
+                export_dir = self.settings.storage_dir / "onnx" / dirname
+                try:
+                    self._model = _OnnxEmbedder(self.settings.embedding_model, export_dir)
+                    logger.info(
+                        "Embedding model %s loaded with ONNX Runtime",
+                        self.settings.embedding_model,
+                    )
+                    return
+                except Exception as exc:
+                    # 缺少依赖、导出失败或 ORT 会话创建失败时都回退到 FlagEmbedding
+                    logger.warning("ONNX Runtime unavailable, using FlagEmbedding: %s", exc)
+
             try:
                 from FlagEmbedding import FlagAutoModel
             except ImportError as exc:
@@ -62,52 +146,167 @@ class EmbeddingService:
                 self._model.target_devices = [self._device]
             logger.info("Embedding model loaded successfully")
 
-    def _load_cache(self) -> None:
-        """从磁盘加载缓存。"""
-        if self._cache_path.exists():
-            try:
-                with self._cache_path.open("rb") as f:
-                    self._cache = pickle.load(f)
-                logger.info("Loaded embedding cache with %s entries", len(self._cache))
-            except Exception as exc:
-                logger.warning("Failed to load embedding cache: %s", exc)
-                self._cache = {}
-
-    def _save_cache(self) -> None:
-        """持久化缓存到磁盘。"""
-        if not self._cache_dirty:
-            return
+    # SQLite 单条语句的绑定参数上限较低，批量查询时按此大小分段
+    _LOOKUP_BATCH = 500
+    # 后台线程在没有新写入通知时的最长等待时间（秒）
+    _FLUSH_INTERVAL = 2.0
+
+    @staticmethod
+    def _resolve_cache_path(path: Path) -> Path:
+        """旧版 pickle 缓存（.pkl 或非 SQLite 文件）无法迁移：键为 sha256 十六进制，
+        与现在的 blake2b 键不兼容。保留原文件，改用同目录下的 .sqlite 文件。"""
+        legacy = path.suffix == ".pkl"
+        if not legacy and path.is_file() and path.stat().st_size:
+            with path.open("rb") as f:
+                legacy = f.read(len(_SQLITE_HEADER)) != _SQLITE_HEADER
+        if not legacy:
+            return path
+        target = path.with_suffix(".sqlite")
+        if target == path:
+            target = path.with_name(f"{path.name}.sqlite")
+        logger.warning(
+            "Embedding cache %s is a legacy pickle cache and will be ignored; using %s instead",
+            path,
+            target,
+        )
+        return target
+
+    def _init_cache(self) -> sqlite3.Connection:
+        """打开按键存储的 SQLite 缓存，向量以 float16 或 int8 字节保存。"""
+        self._cache_path = self._resolve_cache_path(self._cache_path)
+        self._cache_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self._cache_path), check_same_thread=False)
+        conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {self._cache_table} (
+                key BLOB PRIMARY KEY,
+                vector BLOB NOT NULL
+            )
+            """
+        )
+        conn.commit()
+        (count,) = conn.execute(f"SELECT COUNT(*) FROM {self._cache_table}").fetchone()
+        logger.info("Opened embedding cache with %s entries", count)
+        return conn
+
+    @staticmethod
+    def _quantize_int8(embed: np.ndarray) -> bytes:
+        """按向量最大绝对值缩放到 int8，前 4 字节保存 float32 缩放因子。"""
+        scale = float(np.abs(embed).max()) / 127.0 or 1.0
+        quantized = np.round(embed / scale).astype(np.int8)
+        return np.float32(scale).tobytes() + quantized.tobytes()
+
+    @staticmethod
+    def _dequantize_int8(blob: bytes) -> np.ndarray:
+        scale = np.frombuffer(blob, dtype=np.float32, count=1)[0]
+        return np.frombuffer(blob, dtype=np.int8, offset=4).astype(np.float32) * scale
+
+    def _encode_vector(self, embed: np.ndarray) -> bytes:
+        if self._quantize:
+            return self._quantize_int8(embed)
+        return embed.astype(np.float16).tobytes()
+
+    def _decode_vector(self, blob: bytes) -> np.ndarray:
+        if self._quantize:
+            return self._dequantize_int8(blob)
+        return np.frombuffer(blob, dtype=np.float16)
+
+    def _lookup_cache(self, keys: Sequence[bytes]) -> Dict[bytes, np.ndarray]:
+        """批量读取缓存，返回命中的键到向量的映射。"""
+        hits: Dict[bytes, np.ndarray] = {}
+        with self._pending_lock:
+            for key in keys:
+                pending = self._pending.get(key)
+                if pending is not None:
+                    hits[key] = pending
+        unique_keys = [key for key in dict.fromkeys(keys) if key not in hits]
+        with self._cache_lock:
+            for offset in range(0, len(unique_keys), self._LOOKUP_BATCH):
+                batch = unique_keys[offset : offset + self._LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._cache_conn.execute(
+                    f"SELECT key, vector FROM {self._cache_table} WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    hits[key] = self._decode_vector(blob)
+        return hits
+
+    def _store_cache(self, items: Sequence[tuple[bytes, np.ndarray]]) -> None:
+        """登记待写向量并通知后台线程，调用方无需等待磁盘 I/O。"""
+        with self._pending_lock:
+            self._pending.update(items)
+        self._flush_event.set()
 
-        with self._cache_lock:  # ✅ 保护缓存写入
-            if not self._cache_dirty:  # 双重检查
+    def _flush_loop(self) -> None:
+        while not self._closed:
+            self._flush_event.wait(timeout=self._FLUSH_INTERVAL)
+            self._flush_event.clear()
+            self._flush_pending()
+
+    def _flush_pending(self) -> None:
+        """在单个事务中写入缓冲区内的全部向量，只产生增量 I/O。"""
+        with self._pending_lock:
+            if not self._pending:
                 return
+            items = list(self._pending.items())
+        rows = [(key, self._encode_vector(embed)) for key, embed in items]
+        with self._cache_lock:
             try:
-                # 创建父目录
-                self._cache_path.parent.mkdir(parents=True, exist_ok=True)
-                with self._cache_path.open("wb") as f:
-                    pickle.dump(self._cache, f)
-                logger.info("Persisted embedding cache (%s entries)", len(self._cache))
-                self._cache_dirty = False
-            except Exception as exc:
+                with self._cache_conn:
+                    self._cache_conn.executemany(
+                        f"INSERT OR REPLACE INTO {self._cache_table} (key, vector) VALUES (?, ?)",
+                        rows,
+                    )
+            except sqlite3.Error as exc:
                 logger.error("Failed to persist embedding cache: %s", exc)
+                return
+        # 只移除已落盘且未被更新过的条目，期间新登记的向量留待下一轮
+        with self._pending_lock:
+            for key, embed in items:
+                if self._pending.get(key) is embed:
+                    del self._pending[key]
+
+    def close(self) -> None:
+        """停止后台线程并把剩余向量同步写入磁盘。"""
+        if self._closed:
+            return
+        self._closed = True
+        self._flush_event.set()
+        self._flush_thread.join()
+        self._flush_pending()
+        with self._cache_lock:
+            self._cache_conn.close()
 
     @staticmethod
-    def _hash_text(text: str) -> str:
-        """生成文本的哈希值作为缓存键。"""
-        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    def _hash_text(text: str) -> bytes:
+        """生成文本的哈希值作为缓存键（仅用于去重，无需密码学强度）。"""
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
 
     def _embed_batch(self, texts: Sequence[str]) -> np.ndarray:
-        """调用底层模型完成批量编码。"""
+        """调用底层模型完成批量编码，显存不足时减半批大小重试。"""
         self._load_model()
-        # BGE 系列模型的最大输入长度为 512 tokens，超出会导致内部
-        # tokenizer 回退重试并最终触发 batch_size=0 的 edge case。
-        # 将 max_length 固定为 512，减少 FlagEmbedding 内部重试。
-        embeddings = self._model.encode(
-            texts,
-            batch_size=8,
-            max_length=512,
-        )
-        return np.asarray(embeddings, dtype=np.float32)
+        while True:
+            try:
+                # BGE 系列模型的最大输入长度为 512 tokens，超出会导致内部
+                # tokenizer 回退重试并最终触发 batch_size=0 的 edge case。
+                # 将 max_length 固定为 512，减少 FlagEmbedding 内部重试。
+                with torch.inference_mode():
+                    embeddings = self._model.encode(
+                        texts,
+                        batch_size=self._batch_size,
+                        max_length=512,
+                    )
+                return np.asarray(embeddings, dtype=np.float32)
+            except RuntimeError as exc:
+                if "out of memory" not in str(exc).lower() or self._batch_size <= 1:
+                    raise
+                if self._device == "cuda":
+                    torch.cuda.empty_cache()
+                self._batch_size = max(1, self._batch_size // 2)
+                logger.warning(
+                    "Embedding OOM, retrying with batch_size=%s", self._batch_size
+                )
 
     def embed_texts(self, texts: Iterable[str]) -> np.ndarray:
         """批量编码文本，并自动读取/写入缓存。"""
@@ -115,38 +314,35 @@ class EmbeddingService:
         if not texts_list:  # ✅ 处理空列表
             return np.array([]).reshape(0, -1)
 
-        embeddings: List[np.ndarray] = []
-        missing_texts: List[str] = []
-        missing_indices: List[int] = []
+        keys = [self._hash_text(text) for text in texts_list]
+        cached = self._lookup_cache(keys)
 
-        # 读取缓存（使用锁保护）
-        with self._cache_lock:
-            for idx, text in enumerate(texts_list):
-                key = self._hash_text(text)
-                cached = self._cache.get(key)
-                if cached is not None:
-                    embeddings.append(cached)
-                else:
-                    embeddings.append(None)  # type: ignore
-                    missing_texts.append(text)
-                    missing_indices.append(idx)
-
-        # 计算缺失的 embeddings
-        if missing_texts:
-            new_embeds = self._embed_batch(missing_texts)
-
-            # 更新缓存（使用锁保护）
-            with self._cache_lock:
-                for offset, embed in enumerate(new_embeds):
-                    target_idx = missing_indices[offset]
-                    embeddings[target_idx] = embed
-                    cache_key = self._hash_text(texts_list[target_idx])
-                    self._cache[cache_key] = embed
-                    self._cache_dirty = True
-
-            self._save_cache()
-
-        return np.vstack(embeddings)
+        missing_indices = [idx for idx, key in enumerate(keys) if key not in cached]
+        new_embeds = (
+            self._embed_batch([texts_list[idx] for idx in missing_indices])
+            if missing_indices
+            else None
+        )
+
+        # 预分配输出矩阵，命中与新算的向量直接写入，避免 vstack 的额外拷贝
+        dim = (
+            new_embeds.shape[1]
+            if new_embeds is not None
+            else next(iter(cached.values())).shape[0]
+        )
+        out = np.empty((len(texts_list), dim), dtype=np.float32)
+        for idx, key in enumerate(keys):
+            hit = cached.get(key)
+            if hit is not None:
+                out[idx] = hit
+
+        if new_embeds is not None:
+            out[missing_indices] = new_embeds
+            self._store_cache(
+                [(keys[idx], new_embeds[offset]) for offset, idx in enumerate(missing_indices)]
+            )
+
+        return out
 
     def embed_query(self, query: str) -> np.ndarray:
         """针对单条查询返回向量。"""
@@ -159,15 +355,22 @@ class EmbeddingService:
         return self._model
 
     def as_langchain_embedding(self) -> Embeddings:
-        """暴露 LangChain 兼容接口，便于向量库调用。"""
-        service = self
+        """暴露 LangChain 兼容接口，便于向量库调用；适配器无状态，整个实例共用一个。"""
+        return self._langchain_adapter
+
+    @functools.cached_property
+    def _langchain_adapter(self) -> Embeddings:
+        return _LangChainAdapter(self)
+
+
+class _LangChainAdapter(Embeddings):
+    """将 EmbeddingService 适配为 LangChain 的 Embeddings 接口。"""
 
-        class _Adapter(Embeddings):
-            def embed_documents(self, texts: List[str]) -> List[List[float]]:
-                vectors = service.embed_texts(texts)
-                return vectors.tolist()
+    def __init__(self, service: EmbeddingService):
+        self._service = service
 
-            def embed_query(self, text: str) -> List[float]:
-                return service.embed_query(text).tolist()
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._service.embed_texts(texts).tolist()
 
-        return _Adapter()
+    def embed_query(self, text: str) -> List[float]:
+        return self._service.embed_query(text).tolist()
@@ -4,18 +4,48 @@ import asyncio
 import json
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Sequence
 
 from datasets import Dataset
 from ragas import evaluate
 from ragas.metrics import answer_relevancy, context_precision, faithfulness
 
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - 未安装时回退到标准库
+    orjson = None  # type: ignore
+
+try:
+    import ahocorasick  # type: ignore
+except ImportError:  # pragma: no cover - 未安装时回退到逐个子串匹配
+    ahocorasick = None  # type: ignore
+
 from .logger import get_logger
 from .pipeline import RAGPipeline
 from .retriever import Retriever
 
 logger = get_logger(__name__)
 
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+
+def _build_matcher(ground_truths: Sequence[str]) -> Callable[[str], bool]:
+    """构建判断文本是否包含任一标准答案的匹配函数。
+
+    安装 pyahocorasick 时使用 Aho-Corasick 自动机，一次线性扫描即可匹配全部答案。
+    """
+    patterns = [gt for gt in ground_truths if gt]
+    if not patterns:
+        return lambda text: False
+    if ahocorasick is None:
+        return lambda text: any(gt in text for gt in patterns)
+
+    automaton = ahocorasick.Automaton()
+    for gt in patterns:
+        automaton.add_word(gt, gt)
+    automaton.make_automaton()
+    return lambda text: next(automaton.iter(text), None) is not None
+
 
 @dataclass
 class Sample:
@@ -29,18 +59,20 @@ def _load_dataset(path: Path) -> List[Sample]:
     """根据文件格式加载评估数据集。"""
     samples: List[Sample] = []
     if path.suffix.lower() == ".jsonl":
-        for line in path.read_text(encoding="utf-8").splitlines():
-            if not line.strip():
-                continue
-            record = json.loads(line)
-            samples.append(
-                Sample(
-                    question=record["question"],
-                    ground_truths=list(record.get("ground_truths", [])),
+        # 逐行流式读取，避免整份文件驻留内存
+        with path.open("rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = _json_loads(line)
+                samples.append(
+                    Sample(
+                        question=record["question"],
+                        ground_truths=list(record.get("ground_truths", [])),
+                    )
                 )
-            )
     elif path.suffix.lower() in {".json"}:
-        data = json.loads(path.read_text(encoding="utf-8"))
+        data = _json_loads(path.read_bytes())
         for record in data:
             samples.append(
                 Sample(
@@ -83,16 +115,24 @@ async def evaluate_dataset(
         "generation_error": [],
     }
 
-    for idx, sample in enumerate(samples, start=1):
-        logger.info("Evaluating sample %s/%s", idx, len(samples))
-        answer = await asyncio.to_thread(pipeline.answer, sample.question)
+    retriever = Retriever(pipeline.vector_store, top_k=pipeline.settings.rerank_top_k)
+    # 限制同时在途的样本数，避免超出 LLM 服务的速率限制
+    semaphore = asyncio.Semaphore(max(1, pipeline.settings.eval_concurrency))
+
+    async def run_one(idx: int, sample: Sample):
+        async with semaphore:
+            logger.info("Evaluating sample %s/%s", idx, len(samples))
+            return await asyncio.to_thread(pipeline.answer, sample.question)
+
+    # 生成受限于 LLM 网络往返；原始候选只需一次批量检索，与生成并行
+    answers, candidates = await asyncio.gather(
+        asyncio.gather(*(run_one(idx, sample) for idx, sample in enumerate(samples, start=1))),
+        asyncio.to_thread(retriever.retrieve_batch, [sample.question for sample in samples]),
+    )
+
+    for sample, answer, raw_candidates in zip(samples, answers, candidates):
         contexts_info = answer.contexts
         contexts = [ctx["text"] for ctx in contexts_info]
-
-        retriever = Retriever(
-            pipeline.vector_store, top_k=pipeline.settings.rerank_top_k
-        )
-        raw_candidates = await asyncio.to_thread(retriever.retrieve, sample.question)
         raw_texts = [cand.chunk.text for cand in raw_candidates]
 
         ragas_rows["question"].append(sample.question)
@@ -100,10 +140,11 @@ async def evaluate_dataset(
         ragas_rows["contexts"].append(contexts)
         ragas_rows["ground_truth"].append(sample.ground_truths)
 
+        contains_gt = _build_matcher(sample.ground_truths)
         ground_truth_present = False
         first_hit_rank: Optional[int] = None
         for rank, context in enumerate(raw_texts, start=1):
-            if any(gt and gt in context for gt in sample.ground_truths):
+            if contains_gt(context):
                 ground_truth_present = True
                 first_hit_rank = rank
                 break
@@ -111,16 +152,11 @@ async def evaluate_dataset(
         if ground_truth_present:
             retrieval_hits += 1
 
-        answer_contains_gt = any(
-            gt and gt in answer.answer for gt in sample.ground_truths
-        )
+        answer_contains_gt = contains_gt(answer.answer)
         if answer_contains_gt:
             answer_hits += 1
 
-        final_contains_gt = any(
-            any(gt and gt in ctx["text"] for gt in sample.ground_truths)
-            for ctx in contexts_info
-        )
+        final_contains_gt = any(contains_gt(text) for text in contexts)
 
         if not ground_truth_present:
             failure_cases["retrieval_error"].append(
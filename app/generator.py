@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 import time
-from typing import Dict, List, Sequence
+from typing import Dict, List, Sequence, Tuple
 
+import httpx
 from openai import OpenAI
 
 from .config import Settings
@@ -12,36 +13,73 @@ from .types import RetrievalResult
 logger = get_logger(__name__)
 
 
+def build_http_client(
+    *,
+    max_connections: int = 64,
+    max_keepalive_connections: int = 32,
+    timeout: httpx.Timeout | float = 60.0,
+) -> httpx.Client:
+    """创建支持 HTTP/2 与长连接复用的 httpx 客户端，缺少 h2 时回退到 HTTP/1.1。"""
+    # 显式传入 transport 时 httpx 会忽略 Client 上的 http2/limits，需在此处配置
+    limits = httpx.Limits(
+        max_connections=max_connections, max_keepalive_connections=max_keepalive_connections
+    )
+    try:
+        transport = httpx.HTTPTransport(http2=True, limits=limits, retries=2)
+    except ImportError:
+        logger.info("h2 is not installed, falling back to HTTP/1.1")
+        transport = httpx.HTTPTransport(limits=limits, retries=2)
+    return httpx.Client(transport=transport, timeout=timeout)
+
+
 class Generator:
     """负责调用大语言模型生成带引用的回答。"""
 
+    _CONTEXT_TEMPLATE = "[{}] Source: {}\nContent: {}\n"
+
     def __init__(self, settings: Settings):
         if not settings.api_key:
             raise RuntimeError(
                 "API_KEY is required to call the language model. "
                 "Set API_KEY in your environment or .env file."
             )
-        # 初始化 OpenAI 兼容客户端
-        self.client = OpenAI(api_key=settings.api_key, base_url=settings.llm_base_url)
+        # 初始化 OpenAI 兼容客户端，复用连接池以降低并发调用的握手开销
+        self.client = OpenAI(
+            api_key=settings.api_key,
+            base_url=settings.llm_base_url,
+            http_client=build_http_client(),
+        )
         self.model = settings.llm_model
 
-    def _build_context_prompt(self, contexts: Sequence[RetrievalResult]) -> str:
-        """将检索结果整理成提示词上下文。"""
+    def _build_prompt_and_citations(
+        self, contexts: Sequence[RetrievalResult]
+    ) -> Tuple[str, List[Dict]]:
+        """单次遍历检索结果，同时生成提示词上下文与引用列表。"""
         parts: List[str] = []
+        citations: List[Dict] = []
+        template = self._CONTEXT_TEMPLATE
         for idx, result in enumerate(contexts, start=1):
-            metadata = result.chunk.metadata
-            source_name = metadata.get("source_name") or metadata.get("source") or ""
-            parts.append(
-                f"[{idx}] Source: {source_name}\n"
-                f"Content: {result.chunk.text.strip()}\n"
+            chunk = result.chunk
+            metadata = chunk.metadata
+            source_name = metadata.get("source_name") or metadata.get("source")
+            text = chunk.text.strip()
+            parts.append(template.format(idx, source_name or "", text))
+            citations.append(
+                {
+                    "label": f"[{idx}]",
+                    "source": source_name,
+                    "doc_id": chunk.doc_id,
+                    "chunk_id": chunk.chunk_id,
+                    "excerpt": text[:200],
+                }
             )
-        return "\n".join(parts)
+        return "\n".join(parts), citations
 
     def generate_answer(
         self, *, query: str, contexts: Sequence[RetrievalResult]
     ) -> Dict:
         """调用大模型生成答案，并整理引用数据。"""
-        context_prompt = self._build_context_prompt(contexts)
+        context_prompt, citations = self._build_prompt_and_citations(contexts)
         messages = [
             {
                 "role": "system",
@@ -79,19 +117,6 @@ class Generator:
             latency,
         )
 
-        citations: List[Dict] = []
-        for idx, result in enumerate(contexts, start=1):
-            metadata = result.chunk.metadata
-            citations.append(
-                {
-                    "label": f"[{idx}]",
-                    "source": metadata.get("source_name") or metadata.get("source"),
-                    "doc_id": result.chunk.doc_id,
-                    "chunk_id": result.chunk.chunk_id,
-                    "excerpt": result.chunk.text.strip()[:200],
-                }
-            )
-
         return {
             "answer": message.content,
             "latency_ms": latency,
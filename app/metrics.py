@@ -1,57 +1,204 @@
 from __future__ import annotations
+import atexit
+import queue
 import sqlite3
 import threading
+import time
 from contextlib import contextmanager
-from datetime import datetime
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
 
 from .logger import get_logger
 
 logger = get_logger(__name__)
 
+T = TypeVar("T")
+
+# 查询文本去重存放，metrics 只保存整数 query_id
+CREATE_QUERIES_SQL = """
+    CREATE TABLE IF NOT EXISTS queries (
+        id INTEGER PRIMARY KEY,
+        text TEXT UNIQUE NOT NULL
+    )
+"""
+
+CREATE_METRICS_SQL = """
+    CREATE TABLE IF NOT EXISTS metrics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        query_id INTEGER NOT NULL REFERENCES queries(id),
+        latency_ms REAL NOT NULL,
+        retrieval_ms REAL NOT NULL,
+        generation_ms REAL NOT NULL,
+        retrieved_k INTEGER NOT NULL,
+        timestamp INTEGER NOT NULL,
+        status TEXT DEFAULT 'success',
+        rerank_ms REAL NOT NULL DEFAULT 0
+    )
+"""
+
+# 单行汇总表，由写线程随每批插入增量更新，使 aggregates() 不再全表扫描
+CREATE_ROLLUP_SQL = """
+    CREATE TABLE IF NOT EXISTS metrics_rollup (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        total INTEGER NOT NULL,
+        sum_latency REAL NOT NULL,
+        sum_retrieval REAL NOT NULL,
+        sum_generation REAL NOT NULL
+    )
+"""
+
+RECOMPUTE_ROLLUP_SQL = """
+    INSERT OR REPLACE INTO metrics_rollup
+    SELECT 1, COUNT(*), TOTAL(latency_ms), TOTAL(retrieval_ms), TOTAL(generation_ms)
+    FROM metrics
+"""
+
+INSERT_SQL = """
+    INSERT INTO metrics
+    (query_id, latency_ms, retrieval_ms, generation_ms, retrieved_k, timestamp, status, rerank_ms)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+MetricRow = Tuple[str, float, float, float, int, int, str, float]
+# record_many 的输入行：与 record 参数顺序一致（query, latency_ms, retrieval_ms,
+# generation_ms, retrieved_k, status, rerank_ms），时间戳在入队时补齐
+MetricInput = Tuple[str, float, float, float, int, str, float]
+
+
+def _format_timestamp(epoch_ms: int) -> str:
+    """将毫秒时间戳转换为 UTC ISO 字符串（仅在输出时转换）。"""
+    moment = datetime.fromtimestamp(epoch_ms / 1000, tz=timezone.utc)
+    return moment.replace(tzinfo=None).isoformat()
+
 
 class MetricsCollector:
-    """记录查询性能指标到 SQLite 数据库（线程安全版本）。"""
+    """记录查询性能指标到 SQLite 数据库（线程安全版本）。
+
+    写入由后台线程批量提交，``record`` 只入队不等待磁盘；
+    读取不加 Python 锁，由 WAL 保证与写入并发。
+    """
+
+    # 单批最多写入的行数与攒批的最长等待时间（秒）
+    _BATCH_SIZE = 256
+    _BATCH_WAIT = 0.05
+    # 仪表盘轮询的查询结果在内存中缓存的时长（秒）
+    _READ_CACHE_TTL = 1.0
+    # 超出保留条数的旧记录清理间隔（秒）
+    _PRUNE_INTERVAL = 60.0
+    # 写入遇到 "database is locked" 时的最大重试次数（指数退避，首次等待 50ms）
+    _WRITE_RETRIES = 3
+    # 单条 IN 查询的参数个数上限与 query_id 映射缓存的最大条目数
+    _LOOKUP_BATCH = 500
+    _QUERY_ID_CACHE_SIZE = 10000
 
-    def __init__(self, db_path: Path):
+    def __init__(self, db_path: Path, *, retention_rows: int = 0):
         self.db_path = db_path
+        self._retention_rows = retention_rows
+        self._next_prune = 0.0
+        # 写线程独占的 查询文本 -> query_id 映射，避免重复查表
+        self._query_ids: Dict[str, int] = {}
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         self._local = threading.local()  # ✅ 使用线程局部存储
-        self._lock = threading.Lock()
         self._init_db()
+        self._read_cache_lock = threading.Lock()
+        self._agg_cache: Tuple[float, Optional[Dict]] = (0.0, None)
+        self._recent_cache: Dict[int, Tuple[float, List[Dict]]] = {}
+        self._queue: "queue.SimpleQueue[Optional[List[MetricRow]]]" = queue.SimpleQueue()
+        self._closed = False
+        self._writer = threading.Thread(
+            target=self._writer_loop, name="metrics-writer", daemon=True
+        )
+        self._writer.start()
+        atexit.register(self.close)
 
     def _init_db(self):
         """初始化数据库表结构（只在主线程执行一次）。"""
         conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS metrics (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                query TEXT NOT NULL,
-                latency_ms REAL NOT NULL,
-                retrieval_ms REAL NOT NULL,
-                generation_ms REAL NOT NULL,
-                retrieved_k INTEGER NOT NULL,
-                timestamp TEXT NOT NULL,
-                status TEXT DEFAULT 'success'
-            )
-        """)
+        # 必须在建表前设置才会生效；旧库需执行一次 VACUUM 后才切换
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # WAL 允许读写并发；指标可容忍少量丢失，因此降低同步级别减少 fsync
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(CREATE_QUERIES_SQL)
+        conn.execute(CREATE_METRICS_SQL)
+        self._migrate_schema(conn)
+        conn.execute(CREATE_ROLLUP_SQL)
+        if conn.execute("SELECT 1 FROM metrics_rollup").fetchone() is None:
+            conn.execute(RECOMPUTE_ROLLUP_SQL)
         conn.commit()
         conn.close()
 
+    @staticmethod
+    def _migrate_schema(conn: sqlite3.Connection) -> None:
+        """将旧版 metrics 表（内联查询文本、ISO 字符串时间戳）迁移到当前结构。"""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(metrics)")}
+        if "query_id" in columns:
+            return
+        logger.info("Migrating metrics table to the current schema")
+        rerank_expr = "m.rerank_ms" if "rerank_ms" in columns else "0"
+        with conn:
+            conn.execute("ALTER TABLE metrics RENAME TO metrics_legacy")
+            conn.execute(CREATE_METRICS_SQL)
+            conn.execute(
+                "INSERT OR IGNORE INTO queries (text) SELECT DISTINCT query FROM metrics_legacy"
+            )
+            conn.execute(f"""
+                INSERT INTO metrics
+                (id, query_id, latency_ms, retrieval_ms, generation_ms, retrieved_k,
+                 timestamp, status, rerank_ms)
+                SELECT m.id, q.id, m.latency_ms, m.retrieval_ms, m.generation_ms,
+                       m.retrieved_k,
+                       CASE WHEN typeof(m.timestamp) = 'text'
+                            THEN CAST(ROUND((julianday(m.timestamp) - 2440587.5) * 86400000)
+                                      AS INTEGER)
+                            ELSE m.timestamp
+                       END,
+                       m.status, {rerank_expr}
+                FROM metrics_legacy AS m
+                JOIN queries AS q ON q.text = m.query
+            """)
+            conn.execute("DROP TABLE metrics_legacy")
+
+    @staticmethod
+    def _configure_connection(conn: sqlite3.Connection) -> None:
+        """设置仅对当前连接生效的 PRAGMA。"""
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute("PRAGMA cache_size=-20000")
+
     @contextmanager
     def _get_connection(self):
         """获取当前线程的数据库连接（线程安全）。"""
         if not hasattr(self._local, 'conn') or self._local.conn is None:
             self._local.conn = sqlite3.connect(
                 str(self.db_path),
-                check_same_thread=False  # ✅ 允许跨线程
+                check_same_thread=False,  # ✅ 允许跨线程
+                # 自动提交模式：读操作不再隐式开启事务，写事务由 _transaction 显式控制
+                isolation_level=None,
+                # 每个线程独立连接，调大预编译语句缓存确保固定的 SQL 不被重复解析
+                cached_statements=256,
             )
+            self._configure_connection(self._local.conn)
         try:
             yield self._local.conn
         finally:
             pass  # 保持连接打开，由线程退出时清理
 
+    @staticmethod
+    @contextmanager
+    def _transaction(conn: sqlite3.Connection):
+        """以 BEGIN IMMEDIATE 开启写事务，开始即取得写锁，异常时回滚。"""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
     def record(
             self,
             *,
@@ -61,69 +208,272 @@ class MetricsCollector:
             generation_ms: float,
             retrieved_k: int,
             status: str = "success",
+            rerank_ms: float = 0.0,
     ) -> None:
-        """记录一次查询的性能指标（线程安全）。"""
-        timestamp = datetime.utcnow().isoformat()
+        """记录一次查询的性能指标（仅入队，由后台线程写入）。"""
+        timestamp = time.time_ns() // 1_000_000
+        self._queue.put(
+            [
+                (
+                    query,
+                    latency_ms,
+                    retrieval_ms,
+                    generation_ms,
+                    retrieved_k,
+                    timestamp,
+                    status,
+                    rerank_ms,
+                )
+            ]
+        )
+
+    def record_many(self, rows: Iterable[MetricInput]) -> None:
+        """批量记录指标，同一批次保证在同一个事务中写入。"""
+        timestamp = time.time_ns() // 1_000_000
+        batch = [(*row[:5], timestamp, *row[5:]) for row in rows]
+        if batch:
+            self._queue.put(batch)
 
-        with self._lock:  # ✅ 使用锁保护数据库写入
+    def _writer_loop(self) -> None:
+        """持续从队列取出指标，凑满一批或超时后在单个事务中提交。"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = list(item)
+            stop = False
+            deadline = time.monotonic() + self._BATCH_WAIT
+            while len(batch) < self._BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.extend(item)
+            self._write_batch(batch)
+            if self._retention_rows > 0 and time.monotonic() >= self._next_prune:
+                self._next_prune = time.monotonic() + self._PRUNE_INTERVAL
+                self._prune()
+            if stop:
+                return
+
+    def _with_retry(self, operation: Callable[[], T]) -> T:
+        """执行写操作；busy_timeout 之后仍被锁定时按指数退避重试。"""
+        for attempt in range(self._WRITE_RETRIES):
             try:
-                with self._get_connection() as conn:
-                    conn.execute(
-                        """
-                        INSERT INTO metrics 
-                        (query, latency_ms, retrieval_ms, generation_ms, retrieved_k, timestamp, status)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                        """,
-                        (query, latency_ms, retrieval_ms, generation_ms, retrieved_k, timestamp, status),
+                return operation()
+            except sqlite3.OperationalError as exc:
+                if "database is locked" not in str(exc):
+                    raise
+                time.sleep(0.05 * (2 ** attempt))
+        return operation()
+
+    def _write_batch(self, batch: List[MetricRow]) -> None:
+        try:
+            self._with_retry(lambda: self._insert_batch(batch))
+        except Exception as exc:
+            logger.error("Failed to record metrics: %s", exc)
+            return
+        self._invalidate_read_cache()
+
+    def _resolve_query_ids(self, conn: sqlite3.Connection, texts: List[str]) -> Dict[str, int]:
+        """返回查询文本对应的 id，缺失的文本先插入 queries 表。"""
+        resolved = {text: self._query_ids[text] for text in texts if text in self._query_ids}
+        missing = [text for text in dict.fromkeys(texts) if text not in resolved]
+        if missing:
+            conn.executemany(
+                "INSERT OR IGNORE INTO queries (text) VALUES (?)",
+                [(text,) for text in missing],
+            )
+            for offset in range(0, len(missing), self._LOOKUP_BATCH):
+                chunk = missing[offset : offset + self._LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(chunk))
+                resolved.update(
+                    (text, query_id)
+                    for query_id, text in conn.execute(
+                        f"SELECT id, text FROM queries WHERE text IN ({placeholders})",
+                        chunk,
                     )
-                    conn.commit()
-            except Exception as exc:
-                logger.error("Failed to record metrics: %s", exc)
+                )
+        return resolved
+
+    def _insert_batch(self, batch: List[MetricRow]) -> None:
+        with self._get_connection() as conn:
+            with self._transaction(conn):
+                query_ids = self._resolve_query_ids(conn, [row[0] for row in batch])
+                conn.executemany(
+                    INSERT_SQL, [(query_ids[row[0]], *row[1:]) for row in batch]
+                )
+                conn.execute(
+                    """
+                    UPDATE metrics_rollup
+                    SET total = total + ?,
+                        sum_latency = sum_latency + ?,
+                        sum_retrieval = sum_retrieval + ?,
+                        sum_generation = sum_generation + ?
+                    WHERE id = 1
+                    """,
+                    (
+                        len(batch),
+                        sum(row[1] for row in batch),
+                        sum(row[2] for row in batch),
+                        sum(row[3] for row in batch),
+                    ),
+                )
+        # 事务提交成功后才缓存映射，避免回滚后引用不存在的 id
+        if len(self._query_ids) + len(query_ids) > self._QUERY_ID_CACHE_SIZE:
+            self._query_ids.clear()
+        self._query_ids.update(query_ids)
+
+    def _prune(self) -> None:
+        try:
+            removed = self._with_retry(self._delete_expired)
+        except Exception as exc:
+            logger.error("Failed to prune metrics: %s", exc)
+            return
+        if removed:
+            logger.info("Pruned %s metric rows beyond retention", removed)
+            self._invalidate_read_cache()
+
+    def _delete_expired(self) -> int:
+        """删除超出保留条数的旧记录，同步扣减汇总表并回收空闲页，返回删除条数。"""
+        with self._get_connection() as conn:
+            (max_id,) = conn.execute("SELECT MAX(id) FROM metrics").fetchone()
+            cutoff = (max_id or 0) - self._retention_rows
+            if cutoff <= 0:
+                return 0
+            with self._transaction(conn):
+                removed = conn.execute(
+                    """
+                    SELECT COUNT(*), TOTAL(latency_ms), TOTAL(retrieval_ms),
+                           TOTAL(generation_ms)
+                    FROM metrics
+                    WHERE id <= ?
+                    """,
+                    (cutoff,),
+                ).fetchone()
+                if not removed[0]:
+                    return 0
+                conn.execute("DELETE FROM metrics WHERE id <= ?", (cutoff,))
+                conn.execute(
+                    """
+                    UPDATE metrics_rollup
+                    SET total = total - ?,
+                        sum_latency = sum_latency - ?,
+                        sum_retrieval = sum_retrieval - ?,
+                        sum_generation = sum_generation - ?
+                    WHERE id = 1
+                    """,
+                    removed,
+                )
+                conn.execute(
+                    "DELETE FROM queries WHERE id NOT IN (SELECT query_id FROM metrics)"
+                )
+            self._query_ids.clear()
+            # incremental_vacuum 每步只释放一页，需要取完结果才会执行完毕
+            conn.execute("PRAGMA incremental_vacuum(100)").fetchall()
+        return removed[0]
+
+    def _invalidate_read_cache(self) -> None:
+        with self._read_cache_lock:
+            self._agg_cache = (0.0, None)
+            self._recent_cache.clear()
+
+    def close(self) -> None:
+        """通知后台线程写完队列中剩余的指标后退出。"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
 
     def recent(self, limit: int = 50) -> List[Dict]:
         """返回最近的查询记录。"""
+        now = time.monotonic()
+        with self._read_cache_lock:
+            cached = self._recent_cache.get(limit)
+        if cached is not None and now < cached[0]:
+            return list(cached[1])
+
         with self._get_connection() as conn:
             cursor = conn.execute(
                 """
-                SELECT query, latency_ms, retrieval_ms, generation_ms, 
-                       retrieved_k, timestamp, status
-                FROM metrics
-                ORDER BY id DESC
+                SELECT q.text, m.latency_ms, m.retrieval_ms, m.generation_ms,
+                       m.retrieved_k, m.timestamp, m.status, m.rerank_ms
+                FROM metrics AS m
+                JOIN queries AS q ON q.id = m.query_id
+                ORDER BY m.id DESC
                 LIMIT ?
                 """,
                 (limit,),
             )
             rows = cursor.fetchall()
 
-        return [
+        records = [
             {
                 "query": row[0],
                 "latency_ms": row[1],
                 "retrieval_ms": row[2],
                 "generation_ms": row[3],
                 "retrieved_k": row[4],
-                "timestamp": row[5],
+                "timestamp": _format_timestamp(row[5]),
                 "status": row[6],
+                "rerank_ms": row[7],
             }
             for row in rows
         ]
+        with self._read_cache_lock:
+            self._recent_cache[limit] = (now + self._READ_CACHE_TTL, records)
+        return list(records)
 
     def aggregates(self) -> Dict:
-        """返回聚合统计信息。"""
+        """返回聚合统计信息（读取汇总表，O(1)）。"""
+        now = time.monotonic()
+        with self._read_cache_lock:
+            expiry, cached = self._agg_cache
+        if cached is not None and now < expiry:
+            return dict(cached)
+
         with self._get_connection() as conn:
-            cursor = conn.execute("""
-                SELECT 
-                    COUNT(*) as total_queries,
-                    AVG(latency_ms) as avg_latency_ms,
-                    AVG(retrieval_ms) as avg_retrieval_ms,
-                    AVG(generation_ms) as avg_generation_ms
-                FROM metrics
-            """)
-            row = cursor.fetchone()
-
-        return {
-            "total_queries": row[0] or 0,
-            "avg_latency_ms": row[1] or 0.0,
-            "avg_retrieval_ms": row[2] or 0.0,
-            "avg_generation_ms": row[3] or 0.0,
-        }
\ No newline at end of file
+            row = conn.execute(
+                """
+                SELECT total, sum_latency, sum_retrieval, sum_generation
+                FROM metrics_rollup
+                WHERE id = 1
+                """
+            ).fetchone()
+
+        total = row[0] if row else 0
+        if not total:
+            result = {
+                "total_queries": 0,
+                "avg_latency_ms": 0.0,
+                "avg_retrieval_ms": 0.0,
+                "avg_generation_ms": 0.0,
+            }
+        else:
+            result = {
+                "total_queries": total,
+                "avg_latency_ms": row[1] / total,
+                "avg_retrieval_ms": row[2] / total,
+                "avg_generation_ms": row[3] / total,
+            }
+        with self._read_cache_lock:
+            self._agg_cache = (now + self._READ_CACHE_TTL, result)
+        return dict(result)
+
+    def recompute_aggregates(self) -> Dict:
+        """全表扫描重建汇总表，用于修复或核对统计结果。"""
+        def recompute() -> None:
+            with self._get_connection() as conn:
+                with self._transaction(conn):
+                    conn.execute(RECOMPUTE_ROLLUP_SQL)
+
+        self._with_retry(recompute)
+        self._invalidate_read_cache()
+        return self.aggregates()
@@ -1,27 +1,56 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import threading
 import time
-from typing import Dict, Optional
+from collections import OrderedDict
+from dataclasses import replace
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
 
-from .chunking import chunk_corpus
 from .config import Settings, load_settings
-from .data_ingestion import export_documents, load_documents
-from .embedding_service import EmbeddingService
-from .generator import Generator
 from .logger import get_logger
 from .metrics import MetricsCollector
-from .reranker import RerankerConfig, build_reranker
-from .retriever import Retriever
-from .types import Answer
-from .vector_store import VectorStoreManager
+from .types import Answer, RawDocument, RetrievalResult
+
+# torch / faiss / openai 等重依赖在首次使用时才导入，
+# 只需要配置或指标的路径（如 health、metrics）无需承担其导入开销
+if TYPE_CHECKING:
+    from .generator import Generator
+    from .retriever import Retriever
 
 logger = get_logger(__name__)
 
+# 回答缓存键：(规范化查询, top_k, rerank_top_k, 索引版本)
+_AnswerKey = Tuple[str, int, int, int]
+
+
+def _copy_answer(answer: Answer, **changes) -> Answer:
+    """复制回答及其中可变的引用与上下文（含上下文 metadata）。"""
+    return replace(
+        answer,
+        citations=[dict(citation) for citation in answer.citations],
+        contexts=[
+            {**context, "metadata": dict(context.get("metadata") or {})}
+            for context in answer.contexts
+        ],
+        **changes,
+    )
+
 
 class RAGPipeline:
     """统筹“预处理-检索-重排-生成”的端到端流程。"""
 
+    # 相同问题的回答缓存：最多保留的条目数与有效期（秒）
+    _ANSWER_CACHE_SIZE = 128
+    _ANSWER_CACHE_TTL = 300.0
+
     def __init__(self, settings: Optional[Settings] = None):
+        from .embedding_service import EmbeddingService
+        from .reranker import NoOpReranker, RerankerConfig, build_reranker
+        from .vector_store import VectorStoreManager
+
         self.settings = settings or load_settings()
         # 初始化向量服务、索引管理器与度量系统
         self.embedding_service = EmbeddingService(self.settings)
@@ -29,26 +58,51 @@ class RAGPipeline:
             index_path=self.settings.index_path,
             metadata_path=self.settings.store_doc_path,
             embedding_service=self.embedding_service,
+            index_type=self.settings.faiss_index_type,
+            ef_search=self.settings.faiss_ef_search,
+            mmap=self.settings.faiss_mmap,
+            metric=self.settings.faiss_metric,
+        )
+        self.metrics = MetricsCollector(
+            self.settings.metrics_db_path,
+            retention_rows=self.settings.metrics_retention_rows,
         )
-        self.metrics = MetricsCollector(self.settings.metrics_db_path)
         self._generator: Optional[Generator] = None
+        # 未指定 top_k 时的检索深度在配置加载后即可确定
+        self._default_retrieval_depth = max(self.settings.rerank_top_k, self.settings.top_k)
+        # Retriever 的结果缓存自带锁，按检索深度缓存后可在并发请求间共享
+        self._retrievers: Dict[int, Retriever] = {}
+        self._answer_cache: "OrderedDict[_AnswerKey, Tuple[float, Answer]]" = (
+            OrderedDict()
+        )
+        self._answer_cache_lock = threading.Lock()
         self.reranker = build_reranker(
             RerankerConfig(
                 name=self.settings.reranker_name,
                 model=self.settings.reranker_model,
             )
         )
+        # 未启用重排时直接截断检索结果，省去一次无意义的调用与拷贝
+        self._rerank_enabled = not isinstance(self.reranker, NoOpReranker)
 
     @property
     def generator(self) -> Generator:
         if self._generator is None:
+            from .generator import Generator
+
             self._generator = Generator(self.settings)
         return self._generator
 
-    def ingest(self) -> None:
-        """读取文档并构建 FAISS 索引。"""
+    def ingest(self, *, workers: int = 1) -> None:
+        """读取文档并构建 FAISS 索引，``workers`` 控制解析与分块的进程数。"""
+        from .chunking import iter_chunks
+        from .data_ingestion import export_documents, load_documents
 
-        documents = load_documents(self.settings.document_dir)
+        documents = load_documents(
+            self.settings.document_dir,
+            workers=workers,
+            cache_dir=self.settings.storage_dir,
+        )
         if not documents:
             raise RuntimeError(
                 f"No documents found in {self.settings.document_dir}. "
@@ -56,58 +110,184 @@ class RAGPipeline:
             )
 
         export_documents(documents, self.settings.storage_dir / "document_index.jsonl")
+        with self._answer_cache_lock:
+            self._answer_cache.clear()
 
-        chunks = chunk_corpus(
+        # 语料与分块参数均未变化时，复用已保存的向量，只按需重建索引结构
+        corpus_hash = self._corpus_hash(documents)
+        reused = self.vector_store.reindex(corpus_hash)
+        if reused:
+            logger.info("Reused %s stored vectors; ingestion pipeline completed.", reused)
+            return
+
+        # 分块以生成器形式流入向量化，与 embedding 批次交错进行
+        chunks = iter_chunks(
             documents,
             chunk_size=self.settings.chunk_size,
             overlap=self.settings.chunk_overlap,
+            length_unit=self.settings.chunk_unit,
+            workers=workers,
         )
-
-        if not chunks:
+        indexed = self.vector_store.build_index(chunks, corpus_hash=corpus_hash)
+        if not indexed:
             raise RuntimeError("No chunks produced. Check chunking parameters.")
 
-        logger.info("Built %s chunks; creating vector index.", len(chunks))
-        self.vector_store.build_index(chunks)
+        logger.info("Indexed %s chunks into the vector store.", indexed)
         logger.info("Ingestion pipeline completed.")
 
+    def _corpus_hash(self, documents: Sequence[RawDocument]) -> str:
+        """对文档内容、分块参数与 embedding 配置计算指纹，任一变化都会导致重新构建。"""
+        settings = self.settings
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(
+            repr(
+                (
+                    settings.embedding_model,
+                    settings.embed_quantize,
+                    settings.chunk_size,
+                    settings.chunk_overlap,
+                    settings.chunk_unit,
+                    settings.faiss_metric,
+                )
+            ).encode("utf-8")
+        )
+        for document in documents:
+            for part in (document.doc_id, document.source_path, document.text):
+                data = part.encode("utf-8")
+                # 写入长度前缀，避免相邻字段拼接后产生歧义
+                digest.update(len(data).to_bytes(8, "little"))
+                digest.update(data)
+        return digest.hexdigest()
+
     def answer(self, query: str, *, top_k: Optional[int] = None) -> Answer:
         """执行一次检索增强问答。"""
+        t0 = time.perf_counter()
+        cache_key, cached = self._lookup_answer(query, top_k, t0)
+        if cached is not None:
+            return cached
+
+        retriever = self._retriever_for(top_k)
+        # 各阶段共用一组时间点，检索、重排、生成耗时互不重叠
+        t1 = time.perf_counter()
+        retrieval_results = retriever.retrieve(query)
+        t2 = time.perf_counter()
+        return self._complete_answer(query, top_k, cache_key, retrieval_results, (t0, t1, t2))
+
+    async def aanswer(self, query: str, *, top_k: Optional[int] = None) -> Answer:
+        """异步问答：检索经合并器与并发请求攒批执行，重排与生成在默认线程池中完成。"""
+        t0 = time.perf_counter()
+        cache_key, cached = self._lookup_answer(query, top_k, t0)
+        if cached is not None:
+            return cached
+
+        retriever = self._retriever_for(top_k)
+        t1 = time.perf_counter()
+        retrieval_results = await retriever.aretrieve(query)
+        t2 = time.perf_counter()
+        return await asyncio.to_thread(
+            self._complete_answer, query, top_k, cache_key, retrieval_results, (t0, t1, t2)
+        )
+
+    def _lookup_answer(
+        self, query: str, top_k: Optional[int], t0: float
+    ) -> Tuple[_AnswerKey, Optional[Answer]]:
+        """校验查询并计算回答缓存键，命中时记录指标并返回缓存的回答。"""
         if not query.strip():
             raise ValueError("Query must not be empty.")
 
-        start_total = time.perf_counter()
-        # 先检索较大的候选集，再由重排器选出最终 Top-K
-        retrieval_depth = max(self.settings.rerank_top_k, top_k or self.settings.top_k)
-        retriever = Retriever(self.vector_store, top_k=retrieval_depth)
+        from .retriever import normalize_query
 
-        start_retrieval = time.perf_counter()
-        retrieval_results = retriever.retrieve(query)
-        for idx, item in enumerate(retrieval_results, start=1):
-            item.chunk.metadata["retrieval_rank"] = idx
-        reranked_results = self.reranker.rerank(
-            query, retrieval_results, top_k or self.settings.top_k
+        cache_key = (
+            normalize_query(query),
+            top_k or self.settings.top_k,
+            self.settings.rerank_top_k,
+            # 索引重建后版本号递增，旧语料下生成的回答自然失效
+            self.vector_store.version,
         )
-        for idx, item in enumerate(reranked_results, start=1):
-            item.chunk.metadata["rerank_rank"] = idx
-        retrieval_ms = (time.perf_counter() - start_retrieval) * 1000
+        cached = self._get_cached_answer(cache_key)
+        if cached is None:
+            return cache_key, None
+        latency_ms = (time.perf_counter() - t0) * 1000
+        self.metrics.record(
+            query=query,
+            latency_ms=latency_ms,
+            retrieval_ms=0.0,
+            generation_ms=0.0,
+            retrieved_k=len(cached.contexts),
+            status="cache_hit",
+        )
+        return cache_key, _copy_answer(
+            cached, query=query, latency_ms=latency_ms, timestamp=datetime.utcnow()
+        )
+
+    def _retriever_for(self, top_k: Optional[int]) -> Retriever:
+        # 先检索较大的候选集，再由重排器选出最终 Top-K
+        retrieval_depth = (
+            self._default_retrieval_depth
+            if top_k is None
+            else max(self.settings.rerank_top_k, top_k or self.settings.top_k)
+        )
+        retriever = self._retrievers.get(retrieval_depth)
+        if retriever is None:
+            from .retriever import Retriever
 
-        start_generation = time.perf_counter()
+            retriever = self._retrievers.setdefault(
+                retrieval_depth,
+                Retriever(
+                    self.vector_store,
+                    top_k=retrieval_depth,
+                    cache_size=self.settings.retrieval_cache_size,
+                    similarity_threshold=self.settings.retrieval_cache_similarity,
+                ),
+            )
+        return retriever
+
+    def _complete_answer(
+        self,
+        query: str,
+        top_k: Optional[int],
+        cache_key: _AnswerKey,
+        retrieval_results: List[RetrievalResult],
+        timings: Tuple[float, float, float],
+    ) -> Answer:
+        """在检索结果之上完成重排、生成与指标记录。"""
+        t0, t1, t2 = timings
+        # 名次单独记录，不写回可能被并发请求共享的 chunk.metadata
+        retrieval_ranks = {
+            item.chunk.chunk_id: idx for idx, item in enumerate(retrieval_results, start=1)
+        }
+        effective_k = top_k or self.settings.top_k
+        if self._rerank_enabled:
+            reranked_results = self.reranker.rerank(query, retrieval_results, effective_k)
+        else:
+            reranked_results = retrieval_results[:effective_k]
+        # 标注重排名次的同时构造返回的上下文，只遍历一次结果
+        context_payload = []
+        for idx, item in enumerate(reranked_results, start=1):
+            chunk = item.chunk
+            context_payload.append(
+                {
+                    "doc_id": chunk.doc_id,
+                    "chunk_id": chunk.chunk_id,
+                    "text": chunk.text,
+                    "metadata": {
+                        **chunk.metadata,
+                        "score": item.score,
+                        "retrieval_rank": retrieval_ranks.get(chunk.chunk_id),
+                        "rerank_rank": idx,
+                    },
+                }
+            )
+        t3 = time.perf_counter()
         generation_payload = self.generator.generate_answer(
             query=query, contexts=reranked_results
         )
-        generation_ms = (time.perf_counter() - start_generation) * 1000
+        t4 = time.perf_counter()
 
-        total_ms = (time.perf_counter() - start_total) * 1000
-
-        context_payload = [
-            {
-                "doc_id": item.chunk.doc_id,
-                "chunk_id": item.chunk.chunk_id,
-                "text": item.chunk.text,
-                "metadata": item.chunk.metadata,
-            }
-            for item in reranked_results
-        ]
+        retrieval_ms = (t2 - t1) * 1000
+        rerank_ms = (t3 - t2) * 1000
+        generation_ms = (t4 - t3) * 1000
+        total_ms = (t4 - t0) * 1000
 
         answer = Answer(
             query=query,
@@ -117,13 +297,17 @@ class RAGPipeline:
             latency_ms=total_ms,
         )
 
+        # record 只把指标放入队列，由 MetricsCollector 的写线程批量落盘，
+        # 不会阻塞本次请求，因此无需再额外提交到线程池
         self.metrics.record(
             query=query,
             latency_ms=total_ms,
             retrieval_ms=retrieval_ms,
             generation_ms=generation_ms,
             retrieved_k=len(reranked_results),
+            rerank_ms=rerank_ms,
         )
+        self._store_cached_answer(cache_key, answer)
         #retrieval_results = retriever.retrieve(query)
         #print(f"Retrieval Results: {[item.chunk.doc_id for item in retrieval_results]}")
 
@@ -132,6 +316,30 @@ class RAGPipeline:
 
         return answer
 
+    def _get_cached_answer(self, key: _AnswerKey) -> Optional[Answer]:
+        """返回未过期的缓存回答，并将其移到 LRU 队尾。"""
+        with self._answer_cache_lock:
+            entry = self._answer_cache.get(key)
+            if entry is None:
+                return None
+            expiry, answer = entry
+            if time.monotonic() >= expiry:
+                del self._answer_cache[key]
+                return None
+            self._answer_cache.move_to_end(key)
+            return answer
+
+    def _store_cached_answer(self, key: _AnswerKey, answer: Answer) -> None:
+        with self._answer_cache_lock:
+            # 缓存独立副本，调用方修改返回的回答不会影响缓存内容
+            self._answer_cache[key] = (
+                time.monotonic() + self._ANSWER_CACHE_TTL,
+                _copy_answer(answer),
+            )
+            self._answer_cache.move_to_end(key)
+            while len(self._answer_cache) > self._ANSWER_CACHE_SIZE:
+                self._answer_cache.popitem(last=False)
+
     def health(self) -> Dict[str, str]:
         """返回状态检查信息，便于 API 快速验证状态。"""
 
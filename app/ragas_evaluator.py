@@ -1,22 +1,48 @@
 from __future__ import annotations
 
+import asyncio
+import functools
+import hashlib
 import json
+import logging
 import math
+import operator
 import os
-import re
+import shutil
+import sqlite3
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from datetime import datetime
+from importlib import resources
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
 
+import httpx
+import numpy as np
 from openai import OpenAI
 
 from .config import Settings
+from .generator import build_http_client
 from .logger import get_logger
-from .pipeline import RAGPipeline
+
+if TYPE_CHECKING:
+    from datetime import datetime
+
+    from .pipeline import RAGPipeline
 
 logger = get_logger(__name__)
 
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - 未安装时回退到标准库
+    orjson = None  # type: ignore
+
+try:
+    import ijson  # type: ignore
+except ImportError:  # pragma: no cover - 未安装时整体读取数据集
+    ijson = None  # type: ignore
+
 try:
     from langchain_core.embeddings import Embeddings
     from langchain_core.outputs import LLMResult
@@ -57,380 +83,243 @@ except ImportError:  # pragma: no cover
     AnswerRelevancy = ContextPrecision = ContextRecall = Faithfulness = None
 
 LangchainLLMWrapper = _DeprecatedLangchainLLMWrapper or _BaseLangchainLLMWrapper
+_json_loads = orjson.loads if orjson is not None else json.loads
+# 内联评估响应中 raw 字段 repr 回退的最大长度
+_RAW_REPR_LIMIT = 4096
+# 上下文为字典时依次尝试的正文字段
+_CONTEXT_KEYS = ("text", "content", "page_content")
 LangchainLLMWrapperBase = _BaseLangchainLLMWrapper
 
+# 默认数据集以 JSON 资源随包分发，导入模块时不再构造大字面量
+DEFAULT_DATASET_RESOURCE = resources.files(__package__) / "data" / "default_ragas_dataset.json"
 
-DEFAULT_DATASET: List[Dict[str, object]] = [
-     {
-        "question": "根据2022版《中国居民膳食指南》，“食物多样，合理搭配”具体要求：每天膳食至少应包括哪些主要食物类别？从一周角度看，平均每天和每周分别建议吃多少种不同的食物？",
-        "user_input": "根据2022版膳食指南说明：每天应该吃哪些大类食物？一周内每天和每周各要吃多少种食物才算食物多样？",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "膳食指南提出每天饮食应至少包括谷薯类、蔬菜、水果、畜禽鱼蛋奶和大豆等几大类食物；在种类数量上，平均每天应摄入12种以上不同食物，每周应达到25种以上不同食物，以保证膳食多样化。"
-        ],
-        "top_k": 5,
-    },
-    {
-        "question": "根据2022版膳食指南，成年人每日谷类食物、全谷物和杂豆以及薯类的推荐摄入量分别是多少？",
-        "user_input": "成年人每天主食应该吃多少？其中谷类、全谷物和杂豆、薯类各自的推荐摄入量是多少？",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "膳食指南推荐成年人每天摄入谷类食物总量约200～300克，其中全谷物和杂豆应占50～150克；薯类每天建议摄入50～100克，可折算计入主食总量。"
-        ],
-        "top_k": 5,
-    },
-    {
-        "question": "在“多吃蔬果、奶类、全谷、大豆”的核心推荐中，成年人每天新鲜蔬菜和水果各应吃多少？深色蔬菜有什么比例要求？每天奶类大致要摄入多少，果汁能不能代替新鲜水果？",
-        "user_input": "成年人每天应该吃多少蔬菜、水果和奶？深色蔬菜要占多少比例？果汁可以代替新鲜水果吗？",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "指南建议成年人每天新鲜蔬菜不少于300克，其中深色蔬菜约占蔬菜总量的1/2；新鲜水果每天摄入量约200～350克，提倡天天吃水果；奶及奶制品每日摄入量相当于300毫升以上液态奶。果汁不能代替鲜果，应优先选择完整水果。"
-        ],
-        "top_k": 5,
-    },
-    {
-        "question": "根据“适量吃鱼、禽、蛋、瘦肉”的建议，成年人平均每天鱼禽蛋瘦肉合计应吃多少克？从一周来看，鱼类、蛋类和畜禽肉分别推荐多少？在吃鸡蛋和选择肉类方面，指南还有哪些特别强调？",
-        "user_input": "鱼、禽、蛋和瘦肉每天、每周分别推荐吃多少？鸡蛋和肉类选择上有什么特别提示？",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "膳食指南建议鱼、禽、蛋和瘦肉合计，平均每天摄入约120～200克；按周计算，鱼类每周至少吃2次或约300～500克，蛋类每周约300～350克，畜禽肉每周约300～500克。指南强调鸡蛋营养丰富，吃鸡蛋不弃蛋黄；同时提倡优先选择鱼和瘦肉，少吃肥肉、烟熏腌制肉及各类深度加工肉制品。"
-        ],
-        "top_k": 5,
-    },
-    {
-        "question": "在“少盐少油，控糖限酒”的建议中，成年人每天食盐、烹调油、添加糖和反式脂肪酸的摄入上限分别是多少？哪些人群不应饮酒？如果饮酒，每日酒精摄入量应该控制在多少克以内？",
-        "user_input": "膳食指南中，盐、油、糖、反式脂肪酸和酒精分别有哪些具体控制标准？谁不应该喝酒？",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "指南提出成年人每天食盐摄入量不超过5克，烹调油25～30克；添加糖每日不超过50克，最好控制在25克以下；反式脂肪酸每日不超过2克。儿童青少年、孕妇、乳母以及慢性病患者不应饮酒；如成年人饮酒，建议一天摄入的酒精量不超过15克。"
-        ],
-        "top_k": 5,
-    },
-    {
-        "question": "所谓“平衡膳食模式”在食物结构和营养供能比例上有哪些重要特点？特别是碳水化合物和脂肪的供能比大致处于什么范围？",
-        "user_input": "平衡膳食模式强调什么样的食物结构？碳水和脂肪分别应该提供多少比例的能量？",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "平衡膳食模式以植物性食物为主、动物性食物为辅，要求食物种类齐全、比例合理，包括充足的谷类、蔬菜水果、奶类和大豆等，并强调少油、少盐、少糖。在营养供能比例上，碳水化合物供能比约为50%～65%，脂肪供能比约为20%～30%，蛋白质和其他营养素供应充足且平衡，有利于预防营养不足和营养过剩相关疾病。"
-        ],
-        "top_k": 5,
-    },
-    {
-        "question": "文中将无花果称为“树上的糖包子”。新鲜无花果的含糖量范围、GI和GL大约是多少？血糖控制不佳的人群应如何食用？在膳食纤维、钾和硒方面无花果有什么营养优势？",
-        "user_input": "无花果的含糖量、GI、GL分别大概是多少？糖尿病或血糖控制不好的人能怎么吃？它在膳食纤维、钾和硒方面有什么特点？",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "新鲜无花果含糖量约16%～20%，GI约为60、GL约为11，均属中等水平；血糖控制不佳人群要严格控制量，新鲜无花果每天尝鲜1～2个即可，无花果干因含糖接近50%更要限量，并可视作主食的一部分来折算减少米饭面食。无花果膳食纤维含量约3克/100克，高于香蕉和火龙果，有助通便；钾含量约212毫克/100克，接近香蕉，有助调节血压；同时含有一定量硒及多酚、黄酮等抗氧化成分。"
-        ],
-        "top_k": 5,
-    },
-    {
-        "question": "根据文章对甜瓜的介绍：甜瓜的含水量大约是多少？它的含糖量和热量水平如何，为什么说对减重人群比较友好？甜瓜中哪种矿物质含量较高，其典型含量范围是多少？",
-        "user_input": "甜瓜的含水量有多高？糖和热量水平怎样，为什么适合减肥人群？哪种矿物质特别丰富，大概有多少？",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "甜瓜的含水量超过92%，水分非常高；其含糖量大约6%左右，能量不到30千卡/100克，属于低糖、低热量水果，因此在相同体积下获得的能量较少，被视为对减重和控制体重人群比较友好的水果。甜瓜中钾含量相对较高，有些品种可达200～400毫克/100克，有助于维持电解质平衡和调节血压。"
-        ],
-        "top_k": 5,
-    },
-    {
-        "question": "蜂糖李被称为“低糖低热量却甜度爆表”的水果。它的大致含水量、热量和含糖量分别是多少？GI和GL处于什么水平，对血糖有什么意义？从体重管理角度，一天建议吃多少比较合适，为什么不宜一次吃太多？",
-        "user_input": "蜂糖李在水分、热量和含糖量方面有什么特点？GI和GL大概是多少，对血糖友好吗？减肥或控制体重时一天吃多少合适，为什么不能一次吃很多？",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "蜂糖李含水量超过90%，能量约38千卡/100克，含糖量约8.2%，整体属于低糖低能量水果；其GI约24～32、GL约2～4，均为较低水平，对血糖影响相对温和，适合作为控糖人群的水果选择之一。体重管理时每天吃四五个蜂糖李（约100～150克）比较合适，不宜一次吃太多，一方面是避免能量累积过多，也要给其他水果留出空间保持多样化；此外只要不咬碎果核，一般不会释放出果仁中的有毒成分。"
-        ],
-        "top_k": 5,
-    },
-    {
-        "question": "文章中如何评价白芸豆的减肥作用？从能量、蛋白质、膳食纤维和GI来看，白芸豆有哪些有利于体重管理的特点？所谓“白芸豆提取物阻断淀粉减肥”的理论依据是什么？欧洲食品安全局对其减肥功效有什么结论？结合膳食指南，全谷物和杂豆的推荐摄入量与现实摄入情况如何？",
-        "user_input": "白芸豆真的能减肥吗？它在能量、蛋白质、膳食纤维和GI上有什么特点？所谓淀粉阻断机制是什么？EFSA对白芸豆提取物减肥功效是怎么评价的？膳食指南推荐的全谷物和杂豆摄入量与国人实际摄入量有什么差距？",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "白芸豆干品能量约315千卡/100克，但因蛋白质约23克/100克、膳食纤维约9.8克/100克且GI约24，属于高蛋白、高纤维、低GI食物，饱腹感强、血糖上升缓慢，有利于体重管理。所谓“白芸豆提取物阻断淀粉减肥”的理论是其中含有α-淀粉酶抑制剂，可以抑制淀粉分解和吸收，从而在一定程度上减少能量摄入。不过欧洲食品安全局评估认为现有证据不足以证明白芸豆标准化提取物与体重减轻之间存在明确因果关系，不能把它当成可靠的减肥药物。《中国居民膳食指南（2022）》建议成年人每天摄入50～150克全谷物和杂豆，但调查显示我国成年人实际平均摄入不足30克/天，存在明显不足，因此更现实的做法是把白芸豆等杂豆作为主食的一部分，替代部分精制米面，长期改善结构，而不是指望单一食物快速瘦身。"
-        ],
-        "top_k": 5,
-    },
-    {
-        "question": "根据红油玉耳的加工工艺，分析影响产品风味与质构的关键工艺参数，并解释辣椒油制作温度、玉耳泡发时间与灭菌条件对最终感官品质和安全性的作用机理。",
-        "user_input": "根据红油玉耳的加工工艺，分析影响产品风味与质构的关键工艺参数，并解释辣椒油制作温度、玉耳泡发时间与灭菌条件对最终感官品质和安全性的作用机理。",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "红油玉耳的风味和质构主要受玉耳泡发、辣椒油制作温度、灭菌条件三方面影响。",
-            "玉耳泡发：在100℃煮5–8分钟、浸泡60–90分钟可使木耳充分复水、保持脆滑口感。时间过短会偏硬，过长会造成胶质流失、口感松散。",
-            "辣椒油制作温度：230℃炸香葱蒜可形成焦香基调；130℃炒辣椒能避免辣椒素分解、保持鲜辣风味。温度分段控制能使香气层次更丰富。",
-            "灭菌条件：90–100℃水浴灭菌可杀灭微生物并保持质构。过高会使木耳发硬、汤体浑浊；过低则影响安全与保质期。"
-        ],
-        "top_k": 5
-    },
-    {
-        "question": "整理出14种调味酱/汁的主要原料、关键工艺步骤、加热或灭菌参数及其成品特点。",
-        "user_input": "根据文中描述，整理出14种调味酱/汁的主要原料、关键工艺步骤、加热或灭菌参数及其成品特点。",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "桑葚葡萄复合果酒：主要原料：桑葚、葡萄（玫瑰香）、白砂糖、柠檬酸、果胶酶、偏重亚硫酸钾、BV818酵母；关键工艺：压榨过滤→混合打浆→成分调整（糖22°Bx，pH4.4）→酶解45℃ 2h→加亚硫酸钾→接种酵母→20℃发酵→离心过滤→灭菌；加热/灭菌参数：100℃排气5–10min，沸水灭菌15min；成品特点：酒体澄清，香气浓郁，酸甜协调。",
-            "酸枣果酒：主要原料：酸枣、水、白砂糖、果胶酶、柠檬酸钠、酵母菌；关键工艺：挑选清洗→1:3水煮10min→酶解55℃ 3h→过滤→调糖至18%→pH 4.0→酵母活化→26℃发酵5d；加热/灭菌参数：水煮10min；成品特点：果香清新，酒味柔和，酸甜适口。",
-            "石榴葡萄枸杞复合果酒：主要原料：石榴、葡萄、枸杞、白砂糖、果胶酶、SO₂、酵母；关键工艺：取汁混合→糖度24.5°Bx、pH3.8→果胶酶酶解45℃ 2h→加SO₂→37℃酵母活化→20℃发酵59h→离心澄清；加热/灭菌参数：90℃水浴10min排气；成品特点：复合果香明显，色泽鲜艳，酒体清亮。",
-            "酵母-乳酸菌共发酵低醇百香果酒：主要原料：百香果、白砂糖、果胶酶、纤维素酶、焦亚硫酸钾、酵母、乳酸菌；关键工艺：取汁→调糖18%→pH3.5→酶解50℃ 60min→加硫→酵母乳酸菌活化（30℃ 20min）→发酵4d→过滤→巴氏杀菌；加热/灭菌参数：65℃巴氏灭菌30min；成品特点：低醇度、果香清新、口感柔和。",
-            "甘蔗菠萝复合果酒：主要原料：甘蔗、菠萝、白砂糖、果胶酶、偏重亚硫酸钾、柠檬酸、维C、酵母；关键工艺：原料处理→打浆→酶解25℃ 6h→护色→混合1:2→加糖225g/L→杀菌→酵母活化（35℃ 30min）→26℃发酵7d→陈酿2月；加热/灭菌参数：灭菌剂处理；成品特点：酸甜适中，热带风味浓郁，色泽清亮。",
-            "蓝莓复合果酒：主要原料：蓝莓、白砂糖、柠檬酸、果胶酶、酵母；关键工艺：清洗→打浆→酶解45℃ 1.5h→糖度调节→酵母发酵→过滤→灭菌；加热/灭菌参数：沸水灭菌15min；成品特点：色泽紫红，果香浓郁，酸甜适口。",
-            "草莓果酒：主要原料：草莓、白砂糖、果胶酶、酵母、柠檬酸；关键工艺：清洗→打浆→酶解45℃ 2h→加糖调味→接种酵母→发酵→过滤→灭菌；加热/灭菌参数：100℃排气5–10min；成品特点：果香清新，酒体亮红，口感柔和。",
-            "樱桃果酒：主要原料：樱桃、白砂糖、果胶酶、酵母、柠檬酸；关键工艺：挑选→清洗→打浆→酶解50℃ 1.5h→糖度调节→发酵→过滤→灭菌；加热/灭菌参数：95℃水浴10min；成品特点：色泽鲜艳，果香浓郁，酸甜协调。",
-            "柠檬复合果酒：主要原料：柠檬、白砂糖、果胶酶、酵母、焦亚硫酸钾；关键工艺：去皮切块→酶解→糖度调节→酵母发酵→过滤→灭菌；加热/灭菌参数：100℃排气5–10min；成品特点：酸香浓郁，清爽宜人。",
-            "苹果复合果酒：主要原料：苹果、白砂糖、果胶酶、酵母、柠檬酸；关键工艺：清洗→打浆→酶解45℃ 2h→调糖→酵母发酵→过滤→灭菌；加热/灭菌参数：沸水灭菌15min；成品特点：色泽清亮，果香纯正，口感醇和。",
-            "葡萄果酒：主要原料：葡萄、白砂糖、果胶酶、酵母、柠檬酸；关键工艺：清洗→压榨→酶解→糖度调整→发酵→过滤→灭菌；加热/灭菌参数：100℃排气5–10min；成品特点：果香浓郁，酒体澄清。",
-            "黑加仑果酒：主要原料：黑加仑、白砂糖、果胶酶、酵母、柠檬酸；关键工艺：清洗→打浆→酶解45℃ 2h→调糖→发酵→过滤→灭菌；加热/灭菌参数：90℃水浴10min排气；成品特点：色泽深紫，果香浓郁，酸甜适口。",
-            "草莓蓝莓混合果酒：主要原料：草莓、蓝莓、白砂糖、果胶酶、酵母、柠檬酸；关键工艺：清洗→打浆→酶解50℃ 1.5h→糖度调节→发酵→过滤→灭菌；加热/灭菌参数：100℃排气5–10min；成品特点：果香浓郁，色泽鲜艳，酸甜协调。",
-            "复合热带果酒：主要原料：芒果、菠萝、百香果、白砂糖、果胶酶、酵母、柠檬酸；关键工艺：清洗→打浆→酶解45℃ 2h→调糖→发酵→过滤→灭菌；加热/灭菌参数：95–100℃水浴10–15min；成品特点：热带水果香气浓郁，口感酸甜适中。"
-        ],
-        "top_k": 5
-    },
-    {
-        "question": "这8种脆片的加工工艺在‘脱水方式’和‘成品口感控制’上有哪些共性与差异？",
-        "user_input": "这8种脆片的加工工艺在‘脱水方式’和‘成品口感控制’上有哪些共性与差异？",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "共性：以脱水为核心环节，无论采用气流膨化、真空油炸、真空干燥还是烘干，脱水过程直接决定产品的酥脆度和膨化结构。",
-            "普遍进行预处理，如漂烫、糖渍或预冻，以减少褐变、稳定色泽和组织结构。",
-            "后处理环节注重保持脆度，如冷却、分级、充氮包装等，防止吸潮回软。",
-            "差异：气流膨化类（南瓜脆片、黑木耳脆片）高温高压瞬时减压形成疏松多孔结构，口感轻脆。",
-            "真空油炸类（柿子脆片、白萝卜脆片、小麦脆片）低温脱水，油脂包裹形成酥脆感并带油香。",
-            "真空干燥类（猕猴桃脆片）低温保香，脆中略带韧性。",
-            "烘干类（红枣酸奶脆片、薯香酥脆片）质地较密，风味浓郁。"
-        ],
-        "top_k": 5
-    },
-    {
-        "question": "文中提到的几种鸡柳（川香鸡柳、无骨鸡柳、脆皮鸡柳、炼乳脆皮鸡柳）在配方和工艺上的主要差异是什么？",
-        "user_input": "文中提到的几种鸡柳（川香鸡柳、无骨鸡柳、脆皮鸡柳、炼乳脆皮鸡柳）在配方和工艺上的主要差异是什么？",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "川香鸡柳：香辛料复合调味，辣椒粉、姜粉、白胡椒粉比例高，腌渍12小时，油炸后速冻保存，风味突出。",
-            "无骨鸡柳：真空滚揉与速冻工艺，腌渍入味保水性，多种香辛料按口味调整，油炸时间短、速冻温度低，质构细嫩。",
-            "脆皮鸡柳：外层裹浆与脆皮糊配方，高筋面粉、玉米淀粉、泡打粉形成酥脆外壳，油炸180℃约2分钟，色泽金黄、口感酥脆。",
-            "炼乳脆皮鸡柳：在脆皮基础上加入炼乳和蛋清液，使外壳更酥松、带奶香，油炸条件与脆皮鸡柳相近，口感更细腻。"
-        ],
-        "top_k": 5
-    },
-    {
-        "question": "文中所述卤鸭翅的加工过程中，哪些环节对产品的风味形成与安全稳定性起关键作用？请简述原因。",
-        "user_input": "文中所述卤鸭翅的加工过程中，哪些环节对产品的风味形成与安全稳定性起关键作用？请简述原因。",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "风味形成主要受调卤和卤制两个环节影响。",
-            "调卤环节：香辛料炒制与卤汤煮制，辣椒、花椒炒香释放挥发性香气，卤汤加入酱油、糖、味精等构建复合香味。",
-            "卤制环节：15–20分钟中火卤制并静置30分钟，使香味渗入肉质，同时改善肉质和色泽。",
-            "安全稳定性由高压杀菌（115℃，20min）和真空包装保障，杀灭耐热菌与芽孢，延长货架期，防止氧化和微生物生长。"
-        ],
-        "top_k": 5
-    },
-    {
-        "question": "无糖减肥糖果的主要成分及其功能是什么？",
-        "user_input": "无糖减肥糖果的主要成分及其功能是什么？",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "主要成分为麦芽糖醇、藤黄果提取物、瓜拉那提取物、L-酪氨酸、维生素B6、柠檬酸、香料和色素。",
-            "麦芽糖醇低热量、不升血糖。",
-            "藤黄果的HCA能抑制脂肪合成。",
-            "瓜拉那提取物含咖啡因，可提神控食。",
-            "L-酪氨酸可抑制食欲并调节情绪。"
-        ],
-        "top_k": 5
-    },
-    {
-        "question": "不同的食品加工方法会如何影响食品中的主要营养成分？请举例说明。",
-        "user_input": "不同的食品加工方法会如何影响食品中的主要营养成分？请举例说明。",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "加热加工：高温煎、炒、炸使蛋白质过度变性，破坏维生素C和B族维生素，可能生成丙烯酰胺；蒸煮温和，较好保留蛋白质结构和维生素。",
-            "干燥加工：自然干燥易氧化损失维生素C，热风干燥温度高导致营养流失多，冷冻干燥最大限度保留营养和风味。",
-            "腌制加工：盐渍导致水溶性维生素流失，糖渍增加能量摄入。",
-            "发酵加工：分解蛋白质生成氨基酸，提高营养价值，并可增加部分维生素含量。",
-            "现代技术如超高压和微波加热，可杀菌同时减少维生素损失，更好保留营养。"
-        ],
-        "top_k": 5
-    },
-    {
-        "question": "虎皮鸡爪在加工过程中，哪两个环节对其“外酥里嫩”的特色口感形成最关键？请说明原因。",
-        "user_input": "虎皮鸡爪在加工过程中，哪两个环节对其“外酥里嫩”的特色口感形成最关键？请说明原因。",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "挂糖环节：鸡爪浸泡麦芽糖液后，表面形成糖膜，油炸时促进糖类焦化，形成虎皮状纹理并增加酥脆感。",
-            "油炸环节：180℃下油炸5–8分钟，使表皮脱水、收缩、起泡，形成虎皮外壳，同时内部保持水分与胶原蛋白，保证嫩滑弹性。"
-        ],
-        "top_k": 5
-    },
-    {
-        "question": "在肉丸生产工艺中，为什么要先进行“油炸”再进行“蒸煮”？",
-        "user_input": "在肉丸生产工艺中，为什么要先进行“油炸”再进行“蒸煮”？",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "油炸：高温快速脱水，使表层蛋白凝固并形成金黄色焦香外壳，提高口感和香气。",
-            "蒸煮：均匀加热至中心，保证肉丸熟透，同时保持水分，防止过硬。油炸后蒸煮可兼顾口感酥脆与内部嫩滑。"
-        ],
-        "top_k": 5
-    },
-    {
-        "question": "鱼丸加工过程中，“搅拌成胶体”和“热处理成型”对成品质地有何影响？",
-        "user_input": "鱼丸加工过程中，“搅拌成胶体”和“热处理成型”对成品质地有何影响？",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "搅拌成胶体：鱼肉蛋白在高速搅拌下形成网络结构，使鱼丸具有弹性和粘性基础。",
-            "热处理成型：通过加热使蛋白凝固固定形态，同时水分均匀分布，保证鱼丸弹性、紧致而不散。"
-        ],
-        "top_k": 5
-    },
-    {
-        "question": "甜樱桃新的执行标准是什么",
-        "user_input": "甜樱桃新的执行标准是什么",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "甜樱桃新的执行标准是 GB/T 26906—2024。"
-        ],
-        "top_k": 5,
-    },
-    {
-        "question": "商业上制作粉条对于水有什么要求",
-        "user_input": "商业上制作粉条对于水有什么要求",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "应符合GB5749的规定。"
-        ],
-        "top_k": 5,
-    },
-    {
-        "question": "食堂需要对安全人员培训多久？",
-        "user_input": "食堂需要对安全人员培训多久？",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "食品安全总监和食品安全员每年参加培训的时间不少于40小时"
-        ],
-        "top_k": 5,
-    },
-    {
-        "question": "那些用餐单位需要配备安全总监？",
-        "user_input": "那些用餐单位需要配备安全总监？",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "（一）每餐次平均用餐人数300人以上的幼儿园食堂、承包经营企业；（二）每餐次平均用餐人数500人以上的学校食堂、承包经营企业；（三）每餐次平均用餐人数300人以上的养老机构食堂、承包经营企业；（四）每餐次平均用餐人数1000人以上的其他单位食堂、承包经营企业；（五）每餐次平均供餐人数1000人以上的供餐单位。符合前款条件的学校、幼儿园委托承包经营的，学校、幼儿园也应当配备食品安全总监，承担相应责任。县级以上地方市场监督管理部门应当结合实际，指导本辖区具备条件的单位食堂、承包经营企业、供餐单位配备食品安全总监。"
-        ],
-        "top_k": 5,
-    },
-    {
-        "question": "餐饮服务提供者未按规定索证索票的会怎样？",
-        "user_input": "餐饮服务提供者未按规定索证索票的会怎样？",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "纳入省重点监管食品电子追溯系统的食品生产经营企业未按规定传送数据或者上传虚假电子凭证的，由县级以上人民政府食品安全监督管理部门责令改正，给予警告；拒不改正的，处五千元以上五万元以下罚款；情节严重的，责令停产停业，直至吊销许可证。"
-        ],
-        "top_k": 5,
-    },
-    {
-        "question": "学校食品安全实行什么安全制度？",
-        "user_input": "学校食品安全实行什么安全制度？",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "学校食品安全实行校长（园长）负责制"
-            ],
-        "top_k": 5,
-    },
-    {
-        "question": "学校食堂采购、贮存亚硝酸盐会怎样？",
-        "user_input": "学校食堂采购、贮存亚硝酸盐会怎样？",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "由县级以上人民政府食品安全监督管理部门责令改正，给予警告，并处5000元以上3万元以下罚款"
-            ],
-        "top_k": 5,
-    },
-    {
-        "question": "违规食品安全法有哪些严重情形？",
-        "user_input": "违规食品安全法有哪些严重情形？",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "(一)违法行为涉及的产品货值金额2万元以上或者违法行为持续时间3个月以上； (二)造成食源性疾病并出现死亡病例，或者造成30人以上食源性疾病但未出现死亡病例； (三)故意提供虚假信息或者隐瞒真实情况； (四)拒绝、逃避监督检查； (五)因违反食品安全法律、法规受到行政处罚后1年内又实施同一性质的食品安全违法行为，或者因违反食品安全法律、法规受到刑事处罚后又实施食品安全违法行为； (六)其他情节严重的情形。 "
-            ],
-        "top_k": 5,
-    },
-    {
-        "question": "学校食堂采购、贮存亚硝酸盐会怎样？",
-        "user_input": "学校食堂采购、贮存亚硝酸盐会怎样？",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "由县级以上人民政府食品安全监督管理部门责令改正，给予警告，并处5000元以上3万元以下罚款"
-            ],
-        "top_k": 5,
-    },
-    {
-        "question": "当境外发生食品安全事件时，国家出入境检应对相关的食品采取什么控制措施？",
-        "user_input": "当境外发生食品安全事件时，国家出入境检应对相关的食品采取什么控制措施？",
-        "retrieved_contexts": [],
-        "response": "",
-        "reference": "",
-        "ground_truths": [
-            "(一)退货或者销毁处理； (二)有条件地限制进口； (三)暂停或者禁止进口。"
-            ],
-        "top_k": 5,
-    },
-]
+# 已确认存在的数据集路径，同一进程内不再重复 stat
+_dataset_ready: Set[Path] = set()
+_dataset_ready_lock = threading.Lock()
+
+
+def _last_json_object(text: str) -> Optional[str]:
+    """从模型回复中截取最后一个括号配平的 {...}，单次线性扫描。"""
+    end = text.rfind("}")
+    if end < 0:
+        return None
+    depth = 0
+    for idx in range(end, -1, -1):
+        char = text[idx]
+        if char == "}":
+            depth += 1
+        elif char == "{":
+            depth -= 1
+            if depth == 0:
+                return text[idx : end + 1]
+    return None
+
+
+def _slow_to_float(value) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except Exception:
+        return None
+    return None if math.isnan(value) else value
+
+
+def _to_float(value) -> Optional[float]:
+    """将指标值转为 float，NaN 与无法解析的值返回 None；常见数值类型不走异常路径。"""
+    if isinstance(value, (int, float)):
+        return None if math.isnan(value) else float(value)
+    return _slow_to_float(value)
+
+
+def _metric_entry(name: str, score: Optional[float]) -> Dict[str, object]:
+    return {"name": name, "score": score, "ci_low": None, "ci_high": None}
+
+
+def _metrics_from_dict(ragas_result: Dict) -> List[Dict[str, object]]:
+    metrics_summary = [
+        _metric_entry(name, _to_float(value)) for name, value in ragas_result.items()
+    ]
+    logger.debug("RAGAS metrics parsed from dict: %s", metrics_summary)
+    return metrics_summary
+
+
+def _metrics_from_repr_dict(ragas_result) -> List[Dict[str, object]]:
+    metrics_summary = [
+        _metric_entry(name or f"metric_{idx}", _to_float(value))
+        for idx, (name, value) in enumerate(ragas_result._repr_dict.items())
+    ]
+    logger.debug("RAGAS metrics parsed from _repr_dict: %s", metrics_summary)
+    return metrics_summary
+
+
+def _metrics_from_scores(ragas_result) -> List[Dict[str, object]]:
+    return _metrics_from_score_rows([row for row in ragas_result.scores if isinstance(row, dict)])
+
+
+def _metrics_from_score_rows(rows: List[Dict[str, object]]) -> List[Dict[str, object]]:
+    """按列对逐行得分求均值，忽略缺失与无法解析的值。"""
+    columns: Dict[str, List[object]] = defaultdict(list)
+    for row in rows:
+        for key, value in row.items():
+            columns[key].append(value)
+
+    metrics_summary: List[Dict[str, object]] = []
+    for name, values in columns.items():
+        # 整列一次性转换，None 会变为 NaN；含无法解析的值时才逐个转换
+        try:
+            scores = np.asarray(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            scores = np.asarray(
+                [np.nan if (v := _to_float(value)) is None else v for value in values],
+                dtype=np.float64,
+            )
+        valid = scores[~np.isnan(scores)]
+        if valid.size:
+            metrics_summary.append(
+                _metric_entry(name or f"metric_{len(metrics_summary)}", float(valid.mean()))
+            )
+    if metrics_summary:
+        logger.debug("RAGAS metrics computed from raw scores rows: %s", metrics_summary)
+    return metrics_summary
+
+
+def _generic_extract(payload) -> Tuple[object, object]:
+    score = getattr(payload, "score", None) or getattr(payload, "value", payload)
+    ci = getattr(payload, "confidence_interval", None) or getattr(payload, "confidence_interval_", None)
+    return score, ci
+
+
+@functools.lru_cache(maxsize=32)
+def _make_extractor(cls: type) -> Callable[[object], Tuple[object, object]]:
+    """按载荷类型生成 (score, ci) 取值函数，同一类型只探测一次属性。"""
+    # 实例带 __dict__ 时属性无法从类型上确定，只能逐次探测
+    if getattr(cls, "__dictoffset__", 1) != 0:
+        return _generic_extract
+    get_score = operator.attrgetter("score") if hasattr(cls, "score") else None
+    get_value = operator.attrgetter("value") if hasattr(cls, "value") else None
+    get_cis = tuple(
+        operator.attrgetter(name)
+        for name in ("confidence_interval", "confidence_interval_")
+        if hasattr(cls, name)
+    )
+    if get_score is None and get_value is None and not get_cis:
+        # 浮点数等标量：载荷本身就是得分
+        return lambda payload: (payload, None)
+
+    def extract(payload) -> Tuple[object, object]:
+        try:
+            score = (get_score(payload) if get_score else None) or (
+                get_value(payload) if get_value else payload
+            )
+            ci = None
+            for get_ci in get_cis:
+                ci = get_ci(payload)
+                if ci:
+                    break
+        except AttributeError:
+            return _generic_extract(payload)
+        return score, ci
+
+    return extract
+
+
+# 诊断规则：(指标名, 阈值, 问题类型, 建议)，按输出顺序排列
+_DIAG_RULES = (
+    (
+        "faithfulness",
+        0.5,
+        "生成错误",
+        "回答与检索到的上下文不一致，建议检查生成提示词或引用内容。",
+    ),
+    (
+        "context_precision",
+        0.5,
+        "检索错误",
+        "检索返回的片段与问题相关性较低，可以优化向量索引或检索策略。",
+    ),
+    (
+        "context_recall",
+        0.5,
+        "检索错误",
+        "检索可能遗漏关键片段，可增加 Top-K 或补充文档覆盖度。",
+    ),
+    (
+        "answer_relevancy",
+        0.5,
+        "生成错误",
+        "回答与参考答案差距较大，建议检查生成模型或提供更详尽的上下文。",
+    ),
+)
+
+_DIAG_RULE_NAMES = frozenset(rule[0] for rule in _DIAG_RULES)
+
+
+# 按顺序尝试的结果解析器：(匹配条件, 处理函数)；处理结果为空时继续尝试下一项
+_SERIALIZERS = (
+    (lambda r: isinstance(r, dict) and bool(r), _metrics_from_dict),
+    (
+        lambda r: isinstance(getattr(r, "_repr_dict", None), dict) and bool(r._repr_dict),
+        _metrics_from_repr_dict,
+    ),
+    (
+        lambda r: isinstance(getattr(r, "scores", None), list) and bool(r.scores),
+        _metrics_from_scores,
+    ),
+)
+
+
+# 评测调用遇到 429/5xx/连接错误时由 openai 客户端按指数退避重试的次数
+_EVAL_MAX_RETRIES = 3
+
+
+def _build_eval_http_client() -> httpx.Client:
+    # 评测请求会并发扇出，连接上限与保活数保持一致，避免频繁重建 TLS 连接
+    return build_http_client(
+        max_connections=32,
+        max_keepalive_connections=32,
+        timeout=httpx.Timeout(60.0, connect=10.0),
+    )
+
+
+@functools.lru_cache(maxsize=8)
+def _get_openai_client(api_key: str, base_url: Optional[str]) -> OpenAI:
+    """按 (api_key, base_url) 复用 OpenAI 客户端及其 HTTP/2 连接池。"""
+    return OpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=_build_eval_http_client(),
+        max_retries=_EVAL_MAX_RETRIES,
+    )
+
+
+@functools.lru_cache(maxsize=8)
+def _get_chat_openai(model: str, api_key: str, base_url: Optional[str]):
+    """按模型与端点复用 ChatOpenAI 实例。"""
+    return ChatOpenAI(
+        model=model,
+        openai_api_key=api_key,
+        openai_api_base=base_url,
+        http_client=_build_eval_http_client(),
+        max_retries=_EVAL_MAX_RETRIES,
+        # 尝试关闭推理
+        extra_body={"enable_thinking": False},
+    )
+
+
+def _normalize_texts(texts) -> List[str]:
+    """转为字符串并剔除空白文本；已是 str 的输入不再重复转换。"""
+    normalized: List[str] = []
+    for text in texts:
+        value = text if isinstance(text, str) else str(text)
+        if value.strip():
+            normalized.append(value)
+    return normalized
+
+
+# 全部为空白文本时直接返回的只读空矩阵，避免重复分配
+_EMPTY_EMBEDDINGS = np.empty((0, 0), dtype=np.float32)
+_EMPTY_EMBEDDINGS.setflags(write=False)
 
 
 class DashScopeEmbeddings(Embeddings):
@@ -443,44 +332,133 @@ class DashScopeEmbeddings(Embeddings):
         model: str,
         encoding_format: str = "float",
         dimensions: Optional[int] = None,
+        batch_size: int = 25,
+        max_parallel: int = 8,
+        cache_path: Optional[Path] = None,
     ):
         self.client = client
         self.model = model
         self.encoding_format = encoding_format
         self.dimensions = dimensions
+        # DashScope 单次请求最多接受 25 条文本，超出部分拆批并发请求
+        self.batch_size = batch_size
+        self.max_parallel = max_parallel
+        # 可选的磁盘缓存：重复评测相同文本时不再请求接口
+        self._cache_lock = threading.Lock()
+        self._cache_conn: Optional[sqlite3.Connection] = None
+        if cache_path is not None:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            self._cache_conn = sqlite3.connect(str(cache_path), check_same_thread=False)
+            self._cache_conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vec BLOB NOT NULL)"
+            )
+            self._cache_conn.commit()
+
+    def _cache_key(self, text: str) -> bytes:
+        # 键包含模型与维度，切换模型后不会读到旧向量
+        return hashlib.sha256(f"{self.model}|{self.dimensions}|{text}".encode("utf-8")).digest()
+
+    def _lookup_cache(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        if self._cache_conn is None or not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        with self._cache_lock:
+            rows = self._cache_conn.execute(
+                f"SELECT key, vec FROM embeddings WHERE key IN ({placeholders})", keys
+            ).fetchall()
+        return {key: np.frombuffer(blob, dtype=np.float32) for key, blob in rows}
+
+    def _store_cache(self, items: List[Tuple[bytes, np.ndarray]]) -> None:
+        if self._cache_conn is None or not items:
+            return
+        rows = [(key, vec.tobytes()) for key, vec in items]
+        with self._cache_lock:
+            try:
+                with self._cache_conn:
+                    self._cache_conn.executemany(
+                        "INSERT OR REPLACE INTO embeddings (key, vec) VALUES (?, ?)", rows
+                    )
+            except sqlite3.Error as exc:
+                logger.warning("写入评测嵌入缓存失败: %s", exc)
 
-    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
-        if not texts:
-            return []
-        normalized = [str(text) for text in texts if str(text).strip()]
-        if not normalized:
-            return []
+    def _request_embeddings(self, texts: List[str]) -> np.ndarray:
         payload: Dict[str, object] = {
             "model": self.model,
             "encoding_format": self.encoding_format,
         }
-        if len(normalized) == 1:
-            payload["input"] = normalized[0]
+        if len(texts) == 1:
+            payload["input"] = texts[0]
         else:
-            payload["input"] = normalized
+            payload["input"] = texts
         if self.dimensions:
             payload["dimensions"] = self.dimensions
 
         response = self.client.embeddings.create(**payload)
-        return [item.embedding for item in response.data]
+        return np.asarray([item.embedding for item in response.data], dtype=np.float32)
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """返回 (n, dim) 的 float32 矩阵，空白文本会被跳过。"""
+        normalized = _normalize_texts(texts)
+        if not normalized:
+            return _EMPTY_EMBEDDINGS
+        keys = [self._cache_key(text) for text in normalized]
+        cached = self._lookup_cache(keys)
+        missing = [idx for idx, key in enumerate(keys) if key not in cached]
+        if missing:
+            fetched = self._request_embeddings([normalized[idx] for idx in missing])
+            new_items = [(keys[idx], vec) for idx, vec in zip(missing, fetched)]
+            self._store_cache(new_items)
+            cached.update(new_items)
+        return np.stack([cached[key] for key in keys])
+
+    def embed_documents_np(self, texts: List[str]) -> np.ndarray:
+        """批量嵌入并以 float32 矩阵返回，供需要向量化计算的调用方使用。"""
+        normalized = _normalize_texts(texts)
+        batches = [
+            normalized[start : start + self.batch_size]
+            for start in range(0, len(normalized), self.batch_size)
+        ]
+        if len(batches) <= 1:
+            return self._embed_batch(normalized)
+        # SDK 调用是阻塞 I/O，用线程并发发送各批次，map 保证结果顺序
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel, len(batches))) as executor:
+            results = list(executor.map(self._embed_batch, batches))
+        return np.concatenate(results, axis=0)
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        return self._embed_batch(list(texts))
+        # langchain 的 Embeddings 接口约定返回嵌套列表
+        return self.embed_documents_np(texts).tolist()
 
     def embed_query(self, text: str) -> List[float]:
         embeddings = self._embed_batch([text])
-        return embeddings[0] if embeddings else []
+        return embeddings[0].tolist() if len(embeddings) else []
 
 
 if LangchainLLMWrapperBase is not None and LLMResult is not None:
     class SequentialLangchainLLMWrapper(LangchainLLMWrapperBase):
         """通过重复的单次调用模拟多次LangchainLLMWrapper请求"""
 
+        # 异步路径中同时发出的单次调用上限，避免触发服务端限流
+        max_concurrency: int = 8
+
+        @staticmethod
+        def _merge_results(partials: List) -> "LLMResult":
+            """合并 n 次单次调用的结果；n=1 的调用恰好各产出一条 generation。"""
+            n = len(partials)
+            generations: List = [None] * n
+            runs: List = [None] * n
+            llm_output = None
+            for i, partial in enumerate(partials):
+                generations[i] = partial.generations[0][0]
+                runs[i] = partial.run[0] if partial.run else None
+                llm_output = partial.llm_output or llm_output
+            runs = [run for run in runs if run is not None]
+            return LLMResult(
+                generations=[generations],
+                llm_output=llm_output,
+                run=runs or None,
+            )
+
         def generate_text(
             self,
             prompt,
@@ -498,29 +476,16 @@ if LangchainLLMWrapperBase is not None and LLMResult is not None:
                     callbacks=callbacks,
                 )
 
-            combined_generations: List = []
-            combined_runs: List = []
-            llm_output = None
-
-            for _ in range(n):
-                partial = super().generate_text(
+            partials = [None] * n
+            for i in range(n):
+                partials[i] = super().generate_text(
                     prompt=prompt,
                     n=1,
                     temperature=temperature,
                     stop=stop,
                     callbacks=callbacks,
                 )
-                if partial.generations:
-                    combined_generations.extend(partial.generations[0])
-                if partial.run:
-                    combined_runs.extend(partial.run)
-                llm_output = partial.llm_output or llm_output
-
-            return LLMResult(
-                generations=[combined_generations],
-                llm_output=llm_output,
-                run=combined_runs or None,
-            )
+            return self._merge_results(partials)
 
         async def agenerate_text(
             self,
@@ -539,34 +504,28 @@ if LangchainLLMWrapperBase is not None and LLMResult is not None:
                     callbacks=callbacks,
                 )
 
-            combined_generations: List = []
-            combined_runs: List = []
-            llm_output = None
+            semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+            parent = super()
+
+            async def generate_once():
+                async with semaphore:
+                    return await parent.agenerate_text(
+                        prompt=prompt,
+                        n=1,
+                        temperature=temperature,
+                        stop=stop,
+                        callbacks=callbacks,
+                    )
 
-            for _ in range(n):
-                partial = await super().agenerate_text(
-                    prompt=prompt,
-                    n=1,
-                    temperature=temperature,
-                    stop=stop,
-                    callbacks=callbacks,
-                )
-                if partial.generations:
-                    combined_generations.extend(partial.generations[0])
-                if partial.run:
-                    combined_runs.extend(partial.run)
-                llm_output = partial.llm_output or llm_output
+            # n 次调用相互独立，并发发出后按原顺序合并
+            partials = await asyncio.gather(*(generate_once() for _ in range(n)))
 
-            return LLMResult(
-                generations=[combined_generations],
-                llm_output=llm_output,
-                run=combined_runs or None,
-            )
+            return self._merge_results(partials)
 else:
     SequentialLangchainLLMWrapper = None
 
 
-@dataclass
+@dataclass(slots=True)
 class EvaluationResult:
     """封装一次 RAGAS 评估的结果，方便序列化与展示。"""
 
@@ -583,6 +542,20 @@ class EvaluationResult:
             "samples": self.samples,
         }
 
+    def to_json_bytes(self) -> bytes:
+        """直接序列化为 JSON 字节；orjson 原生处理 datetime，无需中间字典转换。"""
+        if orjson is None:
+            return json.dumps(self.to_serializable(), ensure_ascii=False).encode("utf-8")
+        return orjson.dumps(
+            {
+                "variant": self.variant,
+                "run_at": self.run_at,
+                "metrics": self.metrics,
+                "samples": self.samples,
+            },
+            option=orjson.OPT_SERIALIZE_NUMPY,
+        )
+
 
 class RagasEvaluationManager:
     """负责读取评测数据集、执行 RAGAS 评估并缓存结果。"""
@@ -596,18 +569,37 @@ class RagasEvaluationManager:
         self.eval_base_url = settings.eval_llm_base_url
         self.eval_api_key = settings.eval_api_key
         self._configure_llm_environment()
+        # 参考答案与兜底打分的 LLM 回复按内容缓存，重复评测或切换变体时不再重复请求
+        self._llm_cache_lock = threading.Lock()
+        self._llm_cache_conn = sqlite3.connect(
+            str(self.results_dir / "_ref_cache.sqlite"), check_same_thread=False
+        )
+        self._llm_cache_conn.execute("PRAGMA journal_mode=WAL")
+        self._llm_cache_conn.execute(
+            "CREATE TABLE IF NOT EXISTS refcache (key BLOB PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._llm_cache_conn.commit()
         self._eval_client = self._init_eval_client()
         self._ragas_llm = self._init_ragas_llm()
         self._ragas_embeddings = self._init_ragas_embeddings()
         self._ensure_dataset_exists()
 
     def _ensure_dataset_exists(self) -> None:
-        if self.dataset_path.exists():
+        path = self.dataset_path
+        if path in _dataset_ready:
             return
-        logger.info("Creating default RAGAS dataset at %s", self.dataset_path)
-        self.dataset_path.parent.mkdir(parents=True, exist_ok=True)
-        with self.dataset_path.open("w", encoding="utf-8") as f:
-            json.dump(DEFAULT_DATASET, f, ensure_ascii=False, indent=2)
+        with _dataset_ready_lock:
+            if path in _dataset_ready:
+                return
+            if not path.exists():
+                logger.info("Creating default RAGAS dataset at %s", path)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                # 先写临时文件再原子替换，并发进程或中途被杀都不会读到半个文件
+                tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+                with resources.as_file(DEFAULT_DATASET_RESOURCE) as source:
+                    shutil.copyfile(source, tmp_path)
+                os.replace(tmp_path, path)
+            _dataset_ready.add(path)
 
     def _configure_llm_environment(self) -> None:
         """确保 ragas 所依赖的 OpenAI 客户端能读取到正确的密钥与地址。"""
@@ -628,19 +620,15 @@ class RagasEvaluationManager:
             logger.warning("缺少评估模型配置，RAGAS 将无法调用 LLM 指标。")
             return None
         try:
-            llm = ChatOpenAI(
-                model=self.eval_model,
-                openai_api_key=self.eval_api_key,
-                openai_api_base=self.eval_base_url,
-                # 尝试关闭推理
-                extra_body={"enable_thinking": False},
-            )
+            llm = _get_chat_openai(self.eval_model, self.eval_api_key, self.eval_base_url)
             logger.info(
                 "RAGAS LLM initialised: model=%s base=%s",
                 self.eval_model,
                 self.eval_base_url,
             )
-            return SequentialLangchainLLMWrapper(langchain_llm=llm, bypass_n=True)
+            wrapper = SequentialLangchainLLMWrapper(langchain_llm=llm, bypass_n=True)
+            wrapper.max_concurrency = self.settings.eval_concurrency
+            return wrapper
         except Exception as exc:
             logger.warning("初始化 RAGAS LLM 失败: %s", exc)
             return None
@@ -655,10 +643,7 @@ class RagasEvaluationManager:
 
         model_name = self.settings.eval_embedding_model or "text-embedding-3-small"
         try:
-            embedding_client = OpenAI(
-                api_key=self.eval_api_key,
-                base_url=self.eval_base_url,
-            )
+            embedding_client = _get_openai_client(self.eval_api_key, self.eval_base_url)
         except Exception as exc:
             logger.warning("初始化 DashScope Embedding 客户端失败: %s", exc)
             return None
@@ -677,6 +662,7 @@ class RagasEvaluationManager:
                 model=model_name,
                 encoding_format=os.getenv("EVAL_EMBED_ENCODING", "float"),
                 dimensions=dimensions_value,
+                cache_path=self.results_dir / "embed_cache.sqlite",
             )
             logger.info(
                 "RAGAS Embeddings initialised via DashScope SDK: model=%s base=%s",
@@ -688,30 +674,61 @@ class RagasEvaluationManager:
             logger.warning("初始化 RAGAS Embeddings 失败: %s", exc)
             return None
 
-    def _metric_instances(self, include_reference: bool) -> List[object]:
+    @functools.cached_property
+    def _metrics_without_ref(self) -> List[object]:
         if Faithfulness is None:
             raise RuntimeError("ragas 未安装，请安装 ragas 后再试。")
-        metrics: List[object] = [Faithfulness(), ContextPrecision()]
-        if include_reference:
-            metrics.extend([AnswerRelevancy(), ContextRecall()])
-        logger.debug(
-            "RAGAS metric instances prepared (include_reference=%s): %s",
-            include_reference,
-            [m.__class__.__name__ for m in metrics],
-        )
-        return metrics
+        return [Faithfulness(), ContextPrecision()]
+
+    @functools.cached_property
+    def _metrics_with_ref(self) -> List[object]:
+        return [*self._metrics_without_ref, AnswerRelevancy(), ContextRecall()]
+
+    def _metric_instances(self, include_reference: bool) -> List[object]:
+        """返回缓存的指标实例列表；指标对象无跨次运行状态，可重复使用。"""
+        metrics = self._metrics_with_ref if include_reference else self._metrics_without_ref
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "RAGAS metric instances prepared (include_reference=%s): %s",
+                include_reference,
+                [m.__class__.__name__ for m in metrics],
+            )
+        return list(metrics)
 
     def _build_evaluation_dataset(self, records: List[Dict[str, object]]):
         if EvaluationDataset is None:
             raise RuntimeError("ragas 未安装，请安装 ragas 后再试。")
         logger.debug("Building RAGAS EvaluationDataset with records: %s", records)
         return EvaluationDataset.from_list(records)
+
+    def iter_dataset(self) -> Iterator[Dict[str, object]]:
+        """逐条产出数据集样本，跳过问题与参考答案完全相同的重复条目。"""
+        seen: set = set()
+        for record in self._iter_raw_dataset():
+            key = (record.get("question"), tuple(record.get("ground_truths") or ()))
+            if key in seen:
+                logger.info("Skipping duplicate RAGAS sample: %s", key[0])
+                continue
+            seen.add(key)
+            yield record
+
+    def _iter_raw_dataset(self) -> Iterator[Dict[str, object]]:
+        """安装了 ijson 时流式解析，不整体载入文件。"""
+        with self.dataset_path.open("rb") as f:
+            if ijson is None:
+                data = _json_loads(f.read())
+                if not isinstance(data, list):
+                    raise ValueError("RAGAS dataset must be a list of question objects.")
+                yield from data
+                return
+            head = f.read(64).lstrip()
+            if not head.startswith(b"["):
+                raise ValueError("RAGAS dataset must be a list of question objects.")
+            f.seek(0)
+            yield from ijson.items(f, "item", use_float=True)
+
     def load_dataset(self) -> List[Dict[str, object]]:
-        with self.dataset_path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
-        if not isinstance(data, list):
-            raise ValueError("RAGAS dataset must be a list of question objects.")
-        return data
+        return list(self.iter_dataset())
 
     def _init_eval_client(self) -> Optional[OpenAI]:
         if not (self.eval_model and self.eval_base_url and self.eval_api_key):
@@ -720,7 +737,7 @@ class RagasEvaluationManager:
             )
             return None
         try:
-            client = OpenAI(api_key=self.eval_api_key, base_url=self.eval_base_url)
+            client = _get_openai_client(self.eval_api_key, self.eval_base_url)
             logger.info(
                 "Evaluation LLM client initialised (model=%s)", self.eval_model
             )
@@ -739,83 +756,30 @@ class RagasEvaluationManager:
         self,
         ragas_result,
         metric_defs: Optional[List[object]] = None,
+        *,
+        row_map: Optional[List[int]] = None,
     ) -> List[Dict[str, object]]:
-        """兼容不同版本 RAGAS 的指标输出结构。"""
-
-        def _to_float(value) -> Optional[float]:
-            if value is None:
-                return None
-            if isinstance(value, (int, float)):
-                value = float(value)
-                if math.isnan(value):
-                    return None
-                return value
-            try:
-                value = float(value)
-                if math.isnan(value):
-                    return None
-                return value
-            except Exception:
-                return None
+        """兼容不同版本 RAGAS 的指标输出结构。
 
-        if isinstance(ragas_result, dict) and ragas_result:
-            metrics_summary: List[Dict[str, object]] = []
-            for name, value in ragas_result.items():
-                metrics_summary.append(
-                    {
-                        "name": name,
-                        "score": _to_float(value),
-                        "ci_low": None,
-                        "ci_high": None,
-                    }
-                )
-            logger.debug("RAGAS metrics parsed from dict: %s", metrics_summary)
-            return metrics_summary
-
-        repr_dict = getattr(ragas_result, "_repr_dict", None)
-        if isinstance(repr_dict, dict) and repr_dict:
-            metrics_summary = [
-                {
-                    "name": name or f"metric_{idx}",
-                    "score": _to_float(value),
-                    "ci_low": None,
-                    "ci_high": None,
-                }
-                for idx, (name, value) in enumerate(repr_dict.items())
-            ]
-            logger.debug("RAGAS metrics parsed from _repr_dict: %s", metrics_summary)
-            return metrics_summary
+        ``row_map`` 给出每条原始记录对应的去重后行号；提供时先把逐行得分
+        展开回原始行数再求均值，使重复样本与逐条评估时的权重一致。
+        """
 
-        scores_rows = getattr(ragas_result, "scores", None)
-        if isinstance(scores_rows, list) and scores_rows:
-            aggregates: Dict[str, Dict[str, float]] = {}
-            for row in scores_rows:
-                if not isinstance(row, dict):
-                    continue
-                for key, value in row.items():
-                    score_value = _to_float(value)
-                    if score_value is None:
-                        continue
-                    bucket = aggregates.setdefault(key, {"sum": 0.0, "count": 0.0})
-                    bucket["sum"] += score_value
-                    bucket["count"] += 1
-            if aggregates:
-                metrics_summary = []
-                for idx, (name, payload) in enumerate(aggregates.items()):
-                    count = payload["count"]
-                    avg = payload["sum"] / count if count else None
-                    metrics_summary.append(
-                        {
-                            "name": name or f"metric_{idx}",
-                            "score": avg,
-                            "ci_low": None,
-                            "ci_high": None,
-                        }
-                    )
-                logger.debug(
-                    "RAGAS metrics computed from raw scores rows: %s", metrics_summary
+        if row_map is not None:
+            scores = getattr(ragas_result, "scores", None)
+            if isinstance(scores, list) and len(scores) == max(row_map, default=-1) + 1:
+                metrics_summary = _metrics_from_score_rows(
+                    [row for row in map(scores.__getitem__, row_map) if isinstance(row, dict)]
                 )
-                return metrics_summary
+                if metrics_summary:
+                    return metrics_summary
+            logger.warning("RAGAS result has no per-row scores; duplicate rows are weighted once")
+
+        for matches, handler in _SERIALIZERS:
+            if matches(ragas_result):
+                metrics_summary = handler(ragas_result)
+                if metrics_summary:
+                    return metrics_summary
 
         # 直接读取 metrics 列表或字典
         entries = getattr(ragas_result, "metrics", None)
@@ -827,16 +791,17 @@ class RagasEvaluationManager:
             ci_high = None
 
             if isinstance(payload, dict):
-                score = _to_float(payload.get("score"))
-                if score is None:
-                    score = _to_float(payload.get("value"))
+                raw_score = payload.get("score")
+                if raw_score is None:
+                    raw_score = payload.get("value")
+                score = _to_float(raw_score)
                 ci = payload.get("confidence_interval") or payload.get("confidence_interval_")
                 if isinstance(ci, dict):
                     ci_low = _to_float(ci.get("low"))
                     ci_high = _to_float(ci.get("high"))
             else:
-                score = _to_float(getattr(payload, "score", None) or getattr(payload, "value", payload))
-                ci = getattr(payload, "confidence_interval", None) or getattr(payload, "confidence_interval_", None)
+                raw_score, ci = _make_extractor(type(payload))(payload)
+                score = _to_float(raw_score)
                 if isinstance(ci, dict):
                     ci_low = _to_float(ci.get("low"))
                     ci_high = _to_float(ci.get("high"))
@@ -881,18 +846,21 @@ class RagasEvaluationManager:
         return metrics_summary
 
     @staticmethod
-    def _serialize_raw_result(ragas_result) -> Dict[str, object]:
-        """将 RAGAS 原始输出转成可序列化字典，便于调试。"""
-        for attr in ("dict", "as_dict", "to_dict"):
-            if hasattr(ragas_result, attr):
-                try:
-                    data = getattr(ragas_result, attr)()
-                    if isinstance(data, dict):
-                        return data
-                except Exception:
-                    continue
+    def _serialize_raw_result(ragas_result, *, for_json: bool = True) -> Dict[str, object]:
+        """将 RAGAS 原始输出转成可序列化字典，便于调试；用于 JSON 响应时截断 repr。"""
+        for attr in ("to_dict", "dict", "as_dict"):
+            method = getattr(ragas_result, attr, None)
+            if method is None:
+                continue
+            try:
+                data = method()
+                if isinstance(data, dict):
+                    return data
+            except Exception:
+                continue
         try:
-            return {"repr": repr(ragas_result)}
+            text = repr(ragas_result)
+            return {"repr": text[:_RAW_REPR_LIMIT] if for_json else text}
         except Exception:
             return {"repr": "unavailable"}
 
@@ -908,60 +876,56 @@ class RagasEvaluationManager:
             except TypeError:
                 iterable = [raw_contexts]
         contexts_list: List[str] = []
+        append = contexts_list.append
         for item in iterable:
-            if isinstance(item, str):
+            if item.__class__ is str:
                 text = item
             elif isinstance(item, dict):
-                text = item.get("text") or item.get("content") or item.get("page_content") or ""
+                text = next((item[key] for key in _CONTEXT_KEYS if item.get(key)), "")
+                if text.__class__ is not str:
+                    text = str(text)
             else:
                 text = str(item)
-            text = str(text)
-            if text.strip():
-                contexts_list.append(text)
+            if text and not text.isspace():
+                append(text)
         return contexts_list
 
     @staticmethod
     def _diagnose(metrics_summary: List[Dict[str, object]]) -> List[Dict[str, str]]:
-        scores = {item["name"].lower(): item.get("score") for item in metrics_summary}
+        # 解析器产出的指标名通常已是小写，命中规则表时跳过 lower()
+        scores = {}
+        for item in metrics_summary:
+            name = item["name"]
+            if name not in _DIAG_RULE_NAMES:
+                name = name.lower()
+            scores[name] = item.get("score")
         findings: List[Dict[str, str]] = []
+        for name, threshold, kind, detail in _DIAG_RULES:
+            score = scores.get(name)
+            if score is not None and score < threshold:
+                findings.append({"type": kind, "detail": detail})
+        return findings
 
-        faithfulness = scores.get("faithfulness")
-        if faithfulness is not None and faithfulness < 0.5:
-            findings.append(
-                {
-                    "type": "生成错误",
-                    "detail": "回答与检索到的上下文不一致，建议检查生成提示词或引用内容。",
-                }
-            )
-
-        context_precision = scores.get("context_precision")
-        if context_precision is not None and context_precision < 0.5:
-            findings.append(
-                {
-                    "type": "检索错误",
-                    "detail": "检索返回的片段与问题相关性较低，可以优化向量索引或检索策略。",
-                }
-            )
-
-        context_recall = scores.get("context_recall")
-        if context_recall is not None and context_recall < 0.5:
-            findings.append(
-                {
-                    "type": "检索错误",
-                    "detail": "检索可能遗漏关键片段，可增加 Top-K 或补充文档覆盖度。",
-                }
-            )
+    def _llm_cache_key(self, kind: str, *parts: object) -> bytes:
+        payload = json.dumps([kind, self.eval_model, *parts], ensure_ascii=False)
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).digest()
 
-        answer_relevancy = scores.get("answer_relevancy")
-        if answer_relevancy is not None and answer_relevancy < 0.5:
-            findings.append(
-                {
-                    "type": "生成错误",
-                    "detail": "回答与参考答案差距较大，建议检查生成模型或提供更详尽的上下文。",
-                }
-            )
+    def _lookup_llm_cache(self, key: bytes) -> Optional[str]:
+        with self._llm_cache_lock:
+            row = self._llm_cache_conn.execute(
+                "SELECT value FROM refcache WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
 
-        return findings
+    def _store_llm_cache(self, key: bytes, value: str) -> None:
+        with self._llm_cache_lock:
+            try:
+                with self._llm_cache_conn:
+                    self._llm_cache_conn.execute(
+                        "INSERT OR REPLACE INTO refcache (key, value) VALUES (?, ?)", (key, value)
+                    )
+            except sqlite3.Error as exc:
+                logger.warning("写入评测 LLM 缓存失败: %s", exc)
 
     def _fallback_llm_metrics(
         self,
@@ -1002,29 +966,33 @@ class RagasEvaluationManager:
             },
         ]
 
-        try:
-            response = self._eval_client.chat.completions.create(
-                model=self.eval_model,
-                messages=messages,
-            )
-            content = response.choices[0].message.content.strip()
-        except Exception as exc:  # pragma: no cover
-            logger.warning("Fallback LLM metrics failed: %s", exc)
-            return [], [
-                {
-                    "type": "评估提示",
-                    "detail": "评估模型调用失败，无法生成得分。",
-                }
-            ]
+        cache_key = self._llm_cache_key("metrics", question, answer, contexts, reference)
+        content = self._lookup_llm_cache(cache_key)
+        from_cache = content is not None
+        if content is None:
+            try:
+                response = self._eval_client.chat.completions.create(
+                    model=self.eval_model,
+                    messages=messages,
+                )
+                content = response.choices[0].message.content.strip()
+            except Exception as exc:  # pragma: no cover
+                logger.warning("Fallback LLM metrics failed: %s", exc)
+                return [], [
+                    {
+                        "type": "评估提示",
+                        "detail": "评估模型调用失败，无法生成得分。",
+                    }
+                ]
 
         json_text = content
         if not content.startswith("{"):
-            candidates = re.findall(r"\{.*\}", content, flags=re.DOTALL)
-            if candidates:
-                json_text = candidates[-1]
+            json_text = _last_json_object(content) or content
 
         try:
-            data = json.loads(json_text)
+            data = _json_loads(json_text)
+            if not isinstance(data, dict):
+                raise ValueError("expected a JSON object")
         except Exception as exc:
             logger.warning("Fallback LLM metrics解析失败: %s | content=%s", exc, content)
             return [], [
@@ -1034,6 +1002,10 @@ class RagasEvaluationManager:
                 }
             ]
 
+        # 仅缓存能解析出得分对象的回复，格式错误的回复下次会重新请求
+        if not from_cache:
+            self._store_llm_cache(cache_key, content)
+
         metrics_map = {
             "faithfulness": "Faithfulness",
             "answer_relevancy": "Answer Relevancy",
@@ -1041,22 +1013,25 @@ class RagasEvaluationManager:
             "context_recall": "Context Recall",
         }
 
-        metrics: List[Dict[str, object]] = []
-        for key, label in metrics_map.items():
-            score = data.get(key)
-            if isinstance(score, (int, float)):
-                score = max(0.0, min(1.0, float(score)))
-            else:
-                score = None
-            metrics.append(
-                {
-                    "name": key,
-                    "score": score,
-                    "ci_low": None,
-                    "ci_high": None,
-                    "label": label,
-                }
-            )
+        # 四项得分一次性裁剪到 [0, 1]，非数值记为 NaN 并输出 None
+        raw_scores = np.array(
+            [
+                value if isinstance(value := data.get(key), (int, float)) else np.nan
+                for key in metrics_map
+            ],
+            dtype=np.float64,
+        )
+        clipped = np.clip(raw_scores, 0.0, 1.0).tolist()
+        metrics: List[Dict[str, object]] = [
+            {
+                "name": key,
+                "score": None if math.isnan(score) else score,
+                "ci_low": None,
+                "ci_high": None,
+                "label": label,
+            }
+            for (key, label), score in zip(metrics_map.items(), clipped)
+        ]
 
         diagnosis = [
             {
@@ -1068,79 +1043,56 @@ class RagasEvaluationManager:
         return metrics, diagnosis
 
     def run(self, pipeline: RAGPipeline, *, variant: str) -> EvaluationResult:
+        from datetime import datetime
+
         if evaluate is None:
             raise RuntimeError(
                 "ragas 未安装，请运行 `pip install ragas` 或检查依赖。"
             )
 
-        dataset = self.load_dataset()
+        # 各样本的检索生成与参考答案生成都受网络延迟主导，并发执行后按原顺序收集
+        workers = max(1, self.settings.eval_concurrency)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            prepared = list(
+                executor.map(
+                    lambda item: self._prepare_sample(pipeline, variant, *item),
+                    enumerate(self.iter_dataset()),
+                )
+            )
         evaluations: List[Dict[str, object]] = []
         ragas_records: List[Dict[str, object]] = []
-
-        for index, sample in enumerate(dataset):
-            raw_question = sample.get("user_input") or sample.get("question") or sample.get("query")
-            question = str(raw_question).strip() if raw_question is not None else ""
-            if not question:
-                logger.warning("RAGAS dataset[%d] 缺少问题字段，已跳过。", index)
+        for entry in prepared:
+            if entry is None:
                 continue
+            evaluation, ragas_record = entry
+            evaluations.append(evaluation)
+            ragas_records.append(ragas_record)
 
-            top_k = sample.get("top_k")
-            provided_contexts = sample.get("retrieved_contexts") or sample.get("contexts")
-            contexts_from_sample = self._normalise_contexts(provided_contexts)
-            provided_response = sample.get("response")
-
-            use_provided_answer = provided_response is not None and bool(contexts_from_sample)
-
-            if use_provided_answer:
-                contexts_text = contexts_from_sample
-                answer_text = str(provided_response)
-                logger.debug(
-                    "Using precomputed RAG sample for question='%s' (contexts=%d).",
-                    question,
-                    len(contexts_text),
-                )
-            else:
-                logger.info("Running pipeline '%s' for RAGAS sample: %s", variant, question)
-                answer = pipeline.answer(question, top_k=top_k)
-                contexts_text = self._normalise_contexts(answer.contexts)
-                answer_text = answer.answer
-
-            ground_truths_raw = sample.get("ground_truths")
-            ground_truths: List[str] = []
-            if ground_truths_raw:
-                if isinstance(ground_truths_raw, str):
-                    ground_truths = [ground_truths_raw]
-                elif isinstance(ground_truths_raw, (list, tuple)):
-                    ground_truths = [str(item) for item in ground_truths_raw if str(item).strip()]
-
-            reference_text = sample.get("reference")
-            reference_text = str(reference_text).strip() if reference_text else None
-            if not reference_text:
-                reference_text = self._generate_reference_answer(
-                    question=question, contexts=contexts_text
-                )
-            if not reference_text and ground_truths:
-                reference_text = ground_truths[0]
-            display_ground_truths = ground_truths if ground_truths else ([reference_text] if reference_text else [])
-
-            evaluations.append(
-                {
-                    "question": question,
-                    "answer": answer_text,
-                    "contexts": contexts_text,
-                    "ground_truths": display_ground_truths,
-                    "reference": reference_text or "",
-                }
+        # 问题、上下文、回答与参考答案完全相同的记录只需评估一次；
+        # row_map 记录每条原始记录对应的去重后行号，评估后据此展开得分
+        unique_index: Dict[Tuple[object, ...], int] = {}
+        unique_records: List[Dict[str, object]] = []
+        row_map: List[int] = []
+        for record in ragas_records:
+            key = (
+                record["user_input"],
+                tuple(record["retrieved_contexts"]),
+                record["response"],
+                record.get("reference"),
             )
-
-            ragas_record = {
-                "user_input": question,
-                "retrieved_contexts": contexts_text,
-                "response": answer_text,
-            }
-            if reference_text:
-                ragas_record["reference"] = reference_text
-            ragas_records.append(ragas_record)
+            row = unique_index.get(key)
+            if row is None:
+                row = unique_index[key] = len(unique_records)
+                unique_records.append(record)
+            row_map.append(row)
+        has_duplicates = len(unique_records) < len(ragas_records)
+        if has_duplicates:
+            logger.info(
+                "Scoring %d duplicate RAGAS records once for variant %s",
+                len(ragas_records) - len(unique_records),
+                variant,
+            )
+        ragas_records = unique_records
 
         include_reference = all(bool(record.get("reference")) for record in ragas_records)
         logger.debug(
@@ -1165,7 +1117,9 @@ class RagasEvaluationManager:
             **eval_kwargs,
         )
         logger.debug("Batch RAGAS raw result: %s", ragas_result)
-        metrics_summary = self._serialize_metrics(ragas_result)
+        metrics_summary = self._serialize_metrics(
+            ragas_result, row_map=row_map if has_duplicates else None
+        )
         if not metrics_summary or all(m.get("score") is None for m in metrics_summary):
             logger.warning("Batch RAGAS metrics empty for variant %s. Falling back to LLM scoring.", variant)
             fallback_scores: Dict[str, List[float]] = {
@@ -1174,13 +1128,19 @@ class RagasEvaluationManager:
                 "context_precision": [],
                 "context_recall": [],
             }
-            for sample in evaluations:
-                metrics, _ = self._fallback_llm_metrics(
-                    question=sample["question"],
-                    answer=sample["answer"],
-                    contexts=sample["contexts"],
-                    reference=sample.get("reference") or None,
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                fallback_results = list(
+                    executor.map(
+                        lambda sample: self._fallback_llm_metrics(
+                            question=sample["question"],
+                            answer=sample["answer"],
+                            contexts=sample["contexts"],
+                            reference=sample.get("reference") or None,
+                        ),
+                        evaluations,
+                    )
                 )
+            for metrics, _ in fallback_results:
                 for metric in metrics:
                     if metric["score"] is not None:
                         fallback_scores.setdefault(metric["name"], []).append(metric["score"])
@@ -1224,6 +1184,73 @@ class RagasEvaluationManager:
         self._store_result(result)
         return result
 
+    def _prepare_sample(
+        self, pipeline: RAGPipeline, variant: str, index: int, sample: Dict[str, object]
+    ) -> Optional[Tuple[Dict[str, object], Dict[str, object]]]:
+        """为单条样本生成回答与参考答案，返回展示用记录与 RAGAS 记录。"""
+        raw_question = sample.get("user_input") or sample.get("question") or sample.get("query")
+        question = str(raw_question).strip() if raw_question is not None else ""
+        if not question:
+            logger.warning("RAGAS dataset[%d] 缺少问题字段，已跳过。", index)
+            return None
+
+        top_k = sample.get("top_k")
+        provided_contexts = sample.get("retrieved_contexts") or sample.get("contexts")
+        contexts_from_sample = self._normalise_contexts(provided_contexts)
+        provided_response = sample.get("response")
+
+        use_provided_answer = provided_response is not None and bool(contexts_from_sample)
+
+        if use_provided_answer:
+            contexts_text = contexts_from_sample
+            answer_text = str(provided_response)
+            logger.debug(
+                "Using precomputed RAG sample for question='%s' (contexts=%d).",
+                question,
+                len(contexts_text),
+            )
+        else:
+            logger.info("Running pipeline '%s' for RAGAS sample: %s", variant, question)
+            answer = pipeline.answer(question, top_k=top_k)
+            contexts_text = self._normalise_contexts(answer.contexts)
+            answer_text = answer.answer
+
+        ground_truths_raw = sample.get("ground_truths")
+        ground_truths: List[str] = []
+        if ground_truths_raw:
+            if isinstance(ground_truths_raw, str):
+                ground_truths = [ground_truths_raw]
+            elif isinstance(ground_truths_raw, (list, tuple)):
+                ground_truths = [str(item) for item in ground_truths_raw if str(item).strip()]
+
+        reference_text = sample.get("reference")
+        reference_text = str(reference_text).strip() if reference_text else None
+        if not reference_text:
+            reference_text = self._generate_reference_answer(
+                question=question, contexts=contexts_text
+            )
+        if not reference_text and ground_truths:
+            reference_text = ground_truths[0]
+        display_ground_truths = ground_truths if ground_truths else ([reference_text] if reference_text else [])
+
+        evaluation = {
+            "question": question,
+            "answer": answer_text,
+            "contexts": contexts_text,
+            "ground_truths": display_ground_truths,
+            "reference": reference_text or "",
+        }
+
+        ragas_record = {
+            "user_input": question,
+            "retrieved_contexts": contexts_text,
+            "response": answer_text,
+        }
+        if reference_text:
+            ragas_record["reference"] = reference_text
+        return evaluation, ragas_record
+
+
     def _generate_reference_answer(
         self, *, question: str, contexts: List[str]
     ) -> Optional[str]:
@@ -1231,6 +1258,11 @@ class RagasEvaluationManager:
         if self._eval_client is None:
             return None
 
+        cache_key = self._llm_cache_key("reference", question, contexts[:5])
+        cached = self._lookup_llm_cache(cache_key)
+        if cached:
+            return cached
+
         context_snippets = "\n\n".join(contexts[:5]) or "（上下文为空）"
         messages = [
             {
@@ -1271,7 +1303,11 @@ class RagasEvaluationManager:
             logger.warning("Invalid response from evaluation model: %s", exc)
             return None
 
-        return content or None
+        if not content:
+            return None
+        # 空回复不缓存，下次评估时重新生成
+        self._store_llm_cache(cache_key, content)
+        return content
 
     def evaluate_inline(
         self,
@@ -1345,7 +1381,11 @@ class RagasEvaluationManager:
         logger.debug("RAGAS raw result: %s", ragas_result)
         metrics_summary = self._serialize_metrics(ragas_result)
         diagnosis = self._diagnose(metrics_summary)
-        raw_payload = ragas_result if isinstance(ragas_result, dict) else self._serialize_raw_result(ragas_result)
+        raw_payload = (
+            ragas_result
+            if isinstance(ragas_result, dict)
+            else self._serialize_raw_result(ragas_result, for_json=True)
+        )
         if not metrics_summary or all(metric.get("score") is None for metric in metrics_summary):
             logger.warning("Inline RAGAS metrics empty. Raw payload: %s", raw_payload)
             diagnosis.append(
@@ -1375,12 +1415,24 @@ class RagasEvaluationManager:
 
     def _store_result(self, result: EvaluationResult) -> None:
         path = self.results_dir / f"{result.variant}.json"
-        with path.open("w", encoding="utf-8") as f:
-            json.dump(result.to_serializable(), f, ensure_ascii=False, indent=2)
+        # 先写临时文件再原子替换，进程中途退出不会留下半截结果
+        tmp_path = path.with_suffix(".json.tmp")
+        if orjson is not None:
+            tmp_path.write_bytes(
+                orjson.dumps(
+                    result.to_serializable(),
+                    option=orjson.OPT_INDENT_2
+                    | orjson.OPT_NON_STR_KEYS
+                    | orjson.OPT_SERIALIZE_NUMPY,
+                )
+            )
+        else:
+            with tmp_path.open("w", encoding="utf-8") as f:
+                json.dump(result.to_serializable(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
 
     def load_cached(self, variant: str) -> Optional[Dict[str, object]]:
         path = self.results_dir / f"{variant}.json"
         if not path.exists():
             return None
-        with path.open("r", encoding="utf-8") as f:
-            return json.load(f)
+        return _json_loads(path.read_bytes())
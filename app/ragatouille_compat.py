@@ -7,7 +7,13 @@ from types import ModuleType
 from typing import Any, Optional, Sequence
 
 
+# 兼容补丁只需在进程内执行一次
+_ENSURED = False
+
+
 def _module_exists(name: str) -> bool:
+    if name in sys.modules:
+        return True
     try:
         spec = importlib.util.find_spec(name)
     except ModuleNotFoundError:
@@ -25,8 +31,13 @@ def ensure_ragatouille_dependencies() -> None:
     langchain to an older version.
     """
 
+    global _ENSURED
+    if _ENSURED:
+        return
+
     target_module = "langchain.retrievers.document_compressors.base"
     if _module_exists(target_module):
+        _ENSURED = True
         return
 
     import langchain  # noqa: WPS433  # Imported lazily for side effects
@@ -93,3 +104,4 @@ def ensure_ragatouille_dependencies() -> None:
 
     base_module.BaseDocumentCompressor = BaseDocumentCompressor
     sys.modules[target_module] = base_module
+    _ENSURED = True
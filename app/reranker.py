@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import hashlib
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import List, Sequence
+from itertools import islice
+from typing import Any, List, Sequence
 
 from .logger import get_logger
 from .ragatouille_compat import ensure_ragatouille_dependencies
@@ -30,12 +34,15 @@ class NoOpReranker(BaseReranker):
     def rerank(
         self, query: str, candidates: Sequence[RetrievalResult], top_k: int
     ) -> List[RetrievalResult]:
-        return list(candidates)[:top_k]
+        return list(islice(candidates, top_k))
 
 
 class ColBERTReranker(BaseReranker):
     """基于 ColBERTv2 的精排实现。"""
 
+    _ENC_CACHE_SIZE = 4096
+    _ENC_BATCH_SIZE = 32
+
     def __init__(self, model_name: str):
         try:
             ensure_ragatouille_dependencies()
@@ -48,16 +55,126 @@ class ColBERTReranker(BaseReranker):
 
         logger.info("Loading ColBERTv2 reranker model %s", model_name)
         self._model = RAGPretrainedModel.from_pretrained(model_name)
+        # 片段的 token 级向量按文本摘要做 LRU 缓存，重复出现的片段不再过编码器
+        self._enc_cache: "OrderedDict[str, Any]" = OrderedDict()
+        self._enc_lock = threading.Lock()
+        # 编码前后会改写模型的截断长度，同一时间只允许一个编码批次
+        self._encode_lock = threading.Lock()
+        inference = getattr(self._model, "model", None)
+        self._index_free = all(
+            hasattr(inference, name)
+            for name in ("_encode_index_free_documents", "_encode_index_free_queries")
+        )
 
     def rerank(
         self, query: str, candidates: Sequence[RetrievalResult], top_k: int
     ) -> List[RetrievalResult]:
         passages = [item.chunk.text for item in candidates]
-        mapping = {idx: item for idx, item in enumerate(candidates)}
+        if self._index_free and passages:
+            return self._rerank_cached(query, candidates, passages, top_k)
         results = self._model.rerank(query=query, documents=passages, k=top_k)
+        return self._collect(candidates, passages, results, top_k)
+
+    @staticmethod
+    def _passage_key(text: str, doc_maxlen: int) -> str:
+        # 截断长度不同时同一片段的向量也不同，长度一并计入缓存键
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+        return f"{doc_maxlen}:{digest}"
+
+    def _doc_maxlen(self) -> int:
+        """片段编码统一使用检查点支持的最大长度，缓存的向量与编码批次无关且不截断长片段。"""
+        inference = self._model.model
+        max_tokens = getattr(inference, "base_model_max_tokens", None)
+        if max_tokens:
+            return int(max_tokens)
+        tokenizer = getattr(getattr(inference, "inference_ckpt", None), "doc_tokenizer", None)
+        return int(getattr(tokenizer, "doc_maxlen", 512))
+
+    def _encode_documents(self, texts: List[str], doc_maxlen: int) -> Any:
+        inference = self._model.model
+        with self._encode_lock:
+            set_max_tokens = getattr(inference, "_set_inference_max_tokens", None)
+            if set_max_tokens is not None:
+                # RAGatouille 仅在标志未置位时应用长度；与 rank() 一样编码后复位，
+                # 不影响 model.rerank 等路径按调用自行计算长度
+                inference.inference_ckpt_len_set = False
+                set_max_tokens(documents=texts, max_tokens=doc_maxlen)
+            try:
+                embedded, _ = inference._encode_index_free_documents(
+                    texts, bsize=self._ENC_BATCH_SIZE, verbose=False
+                )
+            finally:
+                if set_max_tokens is not None:
+                    inference.inference_ckpt_len_set = False
+        return embedded
+
+    def _passage_embeddings(self, passages: List[str]) -> List[Any]:
+        """返回每个片段去除填充后的 (tokens, dim) 向量，仅编码缓存未命中的片段。"""
+        doc_maxlen = self._doc_maxlen()
+        keys = [self._passage_key(text, doc_maxlen) for text in passages]
+        found: dict = {}
+        with self._enc_lock:
+            for key in keys:
+                embedding = self._enc_cache.get(key)
+                if embedding is not None:
+                    self._enc_cache.move_to_end(key)
+                    found[key] = embedding
+        missing = list(dict.fromkeys(key for key in keys if key not in found))
+        if missing:
+            texts = {key: text for key, text in zip(keys, passages)}
+            embedded = self._encode_documents([texts[key] for key in missing], doc_maxlen)
+            with self._enc_lock:
+                for key, padded in zip(missing, embedded):
+                    # ColBERT 会把填充位置的向量置零，这里去掉以免参与 MaxSim
+                    embedding = padded[padded.abs().sum(dim=-1) > 0]
+                    found[key] = embedding
+                    self._enc_cache[key] = embedding
+                while len(self._enc_cache) > self._ENC_CACHE_SIZE:
+                    self._enc_cache.popitem(last=False)
+        return [found[key] for key in keys]
+
+    def _rerank_cached(
+        self,
+        query: str,
+        candidates: Sequence[RetrievalResult],
+        passages: List[str],
+        top_k: int,
+    ) -> List[RetrievalResult]:
+        import torch
+
+        doc_embeddings = self._passage_embeddings(passages)
+        query_embedding = self._model.model._encode_index_free_queries(
+            query, bsize=self._ENC_BATCH_SIZE
+        )[0][0]
+        padded = torch.nn.utils.rnn.pad_sequence(doc_embeddings, batch_first=True)
+        lengths = torch.tensor([len(emb) for emb in doc_embeddings], device=padded.device)
+        mask = torch.arange(padded.shape[1], device=padded.device)[None, :] < lengths[:, None]
+        # MaxSim：每个查询 token 取与片段 token 的最大相似度后求和
+        similarity = torch.einsum("qd,nld->nql", query_embedding.to(padded.dtype), padded)
+        similarity = similarity.masked_fill(~mask[:, None, :], float("-inf"))
+        scores = similarity.max(dim=-1).values.sum(dim=-1).tolist()
+
+        # 组织成与 RAGatouille 相同的结果结构，去重与补足 top_k 交给 _collect 统一处理
+        order = sorted(range(len(candidates)), key=lambda idx: scores[idx], reverse=True)
+        results = [
+            {"content": passages[idx], "score": scores[idx], "result_index": idx}
+            for idx in order
+        ]
+        return self._collect(candidates, passages, results, top_k)
+
+    @staticmethod
+    def _collect(
+        candidates: Sequence[RetrievalResult],
+        passages: List[str],
+        results: Sequence[dict],
+        top_k: int,
+    ) -> List[RetrievalResult]:
+        mapping = {idx: item for idx, item in enumerate(candidates)}
+        text_to_index = {text: idx for idx, text in reversed(list(enumerate(passages)))}
 
         # RAGatouille returns dicts with `content`, `score`, `rank`, `result_index`
         ranked: List[RetrievalResult] = []
+        ranked_ids = set()
         seen_texts = set()
         for result in results:
             score = float(result.get("score", 0.0))
@@ -66,9 +183,8 @@ class ColBERTReranker(BaseReranker):
             if index is None:
                 if not text:
                     continue
-                try:
-                    index = passages.index(text)
-                except ValueError:
+                index = text_to_index.get(text)
+                if index is None:
                     continue
             item = mapping.get(index)
             if item is None:
@@ -77,11 +193,11 @@ class ColBERTReranker(BaseReranker):
                 continue
             if text:
                 seen_texts.add(text)
-            item.chunk.metadata["score"] = score
-            ranked.append(item)
+            ranked_ids.add(id(item))
+            ranked.append(RetrievalResult(chunk=item.chunk, score=score))
 
         if len(ranked) < top_k:
-            remaining = [item for item in candidates if item not in ranked]
+            remaining = [item for item in candidates if id(item) not in ranked_ids]
             ranked.extend(remaining[: top_k - len(ranked)])
 
         return ranked[:top_k]
@@ -1,8 +1,18 @@
 from __future__ import annotations
 
+import asyncio
+import functools
+import hashlib
+import os
+import re
+import threading
 import time
-from typing import List
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from typing import Any, List, Mapping, Optional, Set, Tuple
 
+import numpy as np
 from langchain_core.documents import Document
 
 from .logger import get_logger
@@ -11,37 +21,306 @@ from .vector_store import VectorStoreManager
 
 logger = get_logger(__name__)
 
+# 文档缺少元数据时共用的只读空字典
+_EMPTY_METADATA: Mapping[str, Any] = MappingProxyType({})
+
+
+# 标点与空白统一折叠为单个空格，仅用于缓存键，不影响实际检索的查询文本
+_QUERY_NOISE_RE = re.compile(r"[\s,.!?;:'\"，。！？、；：“”‘’（）()《》【】]+")
+
+
+def normalize_query(query: str) -> str:
+    """规范化查询（小写、去标点、折叠空白），使等价问法映射到同一缓存键。"""
+    return _QUERY_NOISE_RE.sub(" ", query.lower()).strip()
+
+
+def _init_retrieval_thread() -> None:
+    # OpenMP 线程数按调用线程设置：池内多个检索并发时各自单线程搜索，避免超额订阅
+    try:
+        import faiss
+
+        faiss.omp_set_num_threads(1)
+    except ImportError:  # pragma: no cover - faiss 缺失时检索本身也无法执行
+        pass
+
+
+@functools.lru_cache(maxsize=None)
+def _retrieval_pool() -> ThreadPoolExecutor:
+    """检索专用线程池，与承载 LLM 调用的默认线程池隔离。"""
+    return ThreadPoolExecutor(
+        max_workers=os.cpu_count() or 4,
+        thread_name_prefix="faiss",
+        initializer=_init_retrieval_thread,
+    )
+
 
 class Retriever:
     """封装向量检索流程，并记录耗时信息。"""
 
-    def __init__(self, vector_store: VectorStoreManager, *, top_k: int):
+    # 检索结果缓存的有效期（秒）
+    _CACHE_TTL = 300.0
+
+    def __init__(
+        self,
+        vector_store: VectorStoreManager,
+        *,
+        top_k: int,
+        cache_size: int = 0,
+        similarity_threshold: float = 1.1,
+    ):
         self.vector_store = vector_store
         self.top_k = top_k
+        # 精确缓存按规范化后的查询命中；语义缓存比较查询向量的余弦相似度，
+        # 不低于阈值即复用结果，阈值大于 1 时相当于关闭
+        self._cache_size = max(0, cache_size)
+        self._similarity_threshold = similarity_threshold
+        self._cache_lock = threading.Lock()
+        self._cache: "OrderedDict[str, Tuple[float, int, List[RetrievalResult]]]" = OrderedDict()
+        self._cache_version = vector_store.version
+        # 缓存向量按槽位存放在定长矩阵中，过期或空闲槽位的有效期记为 -inf
+        self._vectors: Optional[np.ndarray] = None
+        self._slot_expiry = np.full(self._cache_size, -np.inf)
+        self._slot_keys: List[Optional[str]] = [None] * self._cache_size
+        self._free_slots = list(range(self._cache_size))
+        self._coalescer: Optional[RetrievalCoalescer] = None
 
     def retrieve(self, query: str) -> List[RetrievalResult]:
         """执行向量检索并封装为 RetrievalResult 列表。"""
         start = time.perf_counter()
-        documents_with_scores = self.vector_store.similarity_search_with_score(
-            query, self.top_k
+        if not self._cache_size:
+            results = self._package(
+                self.vector_store.similarity_search_with_score(query, self.top_k)
+            )
+            self._log_latency(len(results), start)
+            return results
+
+        key = self._cache_key(query)
+        now = time.monotonic()
+        with self._cache_lock:
+            cached = self._lookup_exact(key, now)
+        if cached is not None:
+            logger.info("Retrieval cache hit for query")
+            return list(cached)
+
+        embedding = np.asarray(
+            self.vector_store.embedding_service.embed_query(query), dtype=np.float32
         )
-        latency = (time.perf_counter() - start) * 1000
-        logger.info(
-            "Retrieved %s documents in %.2f ms", len(documents_with_scores), latency
+        if self._similarity_threshold <= 1.0:
+            with self._cache_lock:
+                cached = self._lookup_semantic(embedding, now)
+            if cached is not None:
+                logger.info("Semantic retrieval cache hit for query")
+                return list(cached)
+
+        results = self._package(
+            self.vector_store.similarity_search_by_vector_with_score(embedding, self.top_k)
         )
+        self._log_latency(len(results), start)
+        with self._cache_lock:
+            self._store(key, embedding, results, now)
+        return list(results)
+
+    async def aretrieve(self, query: str) -> List[RetrievalResult]:
+        """异步检索：并发请求经合并器攒批后直接提交到检索线程池，不占用默认线程池。"""
+        if self._coalescer is None:
+            self._coalescer = RetrievalCoalescer(self)
+        return await self._coalescer.submit(query)
+
+    def retrieve_batch(self, queries: List[str]) -> List[List[RetrievalResult]]:
+        """批量检索多条查询，查询向量一次编码、FAISS 一次搜索。"""
+        start = time.perf_counter()
+        queries = list(queries)
+        if self._cache_size:
+            results = self._retrieve_batch_cached(queries)
+        else:
+            batches = self.vector_store.similarity_search_batch(queries, self.top_k)
+            results = [self._package(hits) for hits in batches]
+        latency = (time.perf_counter() - start) * 1000
+        logger.info("Retrieved documents for %s queries in %.2f ms", len(results), latency)
+        return results
+
+    def _retrieve_batch_cached(self, queries: List[str]) -> List[List[RetrievalResult]]:
+        """先查精确与语义缓存，未命中的查询一次编码、一次 FAISS 检索后回填缓存。"""
+        now = time.monotonic()
+        keys = [self._cache_key(query) for query in queries]
+        results: List[Optional[List[RetrievalResult]]] = [None] * len(queries)
+        with self._cache_lock:
+            for idx, key in enumerate(keys):
+                results[idx] = self._lookup_exact(key, now)
+        pending = [idx for idx, cached in enumerate(results) if cached is None]
+        if pending:
+            embeddings = np.asarray(
+                self.vector_store.embedding_service.embed_texts([queries[i] for i in pending]),
+                dtype=np.float32,
+            )
+            if self._similarity_threshold <= 1.0:
+                with self._cache_lock:
+                    for row, idx in enumerate(pending):
+                        results[idx] = self._lookup_semantic(embeddings[row], now)
+            misses = [row for row, idx in enumerate(pending) if results[idx] is None]
+            if misses:
+                batches = self.vector_store.similarity_search_batch_by_vectors(
+                    embeddings[misses], self.top_k
+                )
+                packaged = [self._package(hits) for hits in batches]
+                with self._cache_lock:
+                    for row, hits in zip(misses, packaged):
+                        idx = pending[row]
+                        results[idx] = hits
+                        self._store(keys[idx], embeddings[row], hits, now)
+        return [list(hits) for hits in results]
+
+    @staticmethod
+    def _cache_key(query: str) -> str:
+        return hashlib.blake2b(normalize_query(query).encode("utf-8"), digest_size=16).hexdigest()
+
+    def _check_version(self) -> None:
+        """索引重建后清空缓存；调用方需持有锁。"""
+        version = self.vector_store.version
+        if version == self._cache_version:
+            return
+        self._cache.clear()
+        self._slot_expiry.fill(-np.inf)
+        self._slot_keys = [None] * self._cache_size
+        self._free_slots = list(range(self._cache_size))
+        self._cache_version = version
+
+    def _lookup_exact(self, key: str, now: float) -> Optional[List[RetrievalResult]]:
+        self._check_version()
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expiry, slot, results = entry
+        if now >= expiry:
+            self._evict(key)
+            return None
+        self._cache.move_to_end(key)
+        return results
+
+    def _lookup_semantic(
+        self, embedding: np.ndarray, now: float
+    ) -> Optional[List[RetrievalResult]]:
+        self._check_version()
+        if self._vectors is None or not self._cache:
+            return None
+        norm = float(np.linalg.norm(embedding))
+        if not norm:
+            return None
+        similarities = (self._vectors @ embedding) / norm
+        similarities[self._slot_expiry <= now] = -np.inf
+        slot = int(np.argmax(similarities))
+        if similarities[slot] < self._similarity_threshold:
+            return None
+        key = self._slot_keys[slot]
+        self._cache.move_to_end(key)
+        return self._cache[key][2]
+
+    def _store(
+        self, key: str, embedding: np.ndarray, results: List[RetrievalResult], now: float
+    ) -> None:
+        self._check_version()
+        if key in self._cache:
+            self._evict(key)
+        if not self._free_slots:
+            self._evict(next(iter(self._cache)))
+        if self._vectors is None:
+            self._vectors = np.zeros((self._cache_size, embedding.shape[0]), dtype=np.float32)
+        slot = self._free_slots.pop()
+        # 查询向量归一化后，点积即余弦相似度
+        norm = float(np.linalg.norm(embedding))
+        self._vectors[slot] = embedding / norm if norm else embedding
+        expiry = now + self._CACHE_TTL
+        self._slot_expiry[slot] = expiry
+        self._slot_keys[slot] = key
+        self._cache[key] = (expiry, slot, results)
+
+    def _evict(self, key: str) -> None:
+        _, slot, _ = self._cache.pop(key)
+        self._slot_expiry[slot] = -np.inf
+        self._slot_keys[slot] = None
+        self._free_slots.append(slot)
 
+    @staticmethod
+    def _log_latency(count: int, start: float) -> None:
+        latency = (time.perf_counter() - start) * 1000
+        logger.info("Retrieved %s documents in %.2f ms", count, latency)
+
+    @staticmethod
+    def _package(
+        documents_with_scores: List[Tuple[Document, float]]
+    ) -> List[RetrievalResult]:
+        # 得分整体转换为 Python float，避免逐条 float() 转换 numpy 标量
+        scores = np.fromiter(
+            (score for _, score in documents_with_scores),
+            dtype=np.float32,
+            count=len(documents_with_scores),
+        ).tolist()
         results: List[RetrievalResult] = []
-        for doc, score in documents_with_scores:
-            metadata = doc.metadata or {}
-            # 将得分写回元数据，方便后续分析
-            metadata["score"] = float(score)
+        append = results.append
+        for (doc, _), score in zip(documents_with_scores, scores):
+            # metadata 归 docstore 所有且在并发请求间共享，只读不写；得分仅保存在结果对象上
+            metadata = doc.metadata or _EMPTY_METADATA
+            get = metadata.get
             chunk = DocumentChunk(
-                doc_id=metadata.get("doc_id", ""),
-                chunk_id=metadata.get("chunk_id", ""),
+                doc_id=get("doc_id", ""),
+                chunk_id=get("chunk_id", ""),
                 text=doc.page_content,
-                start_index=int(metadata.get("start_index", 0)),
-                end_index=int(metadata.get("end_index", 0)),
+                start_index=int(get("start_index", 0)),
+                end_index=int(get("end_index", 0)),
                 metadata=metadata,
             )
-            results.append(RetrievalResult(chunk=chunk, score=score))
+            append(RetrievalResult(chunk=chunk, score=score))
         return results
+
+
+class RetrievalCoalescer:
+    """把短时间窗口内到达的并发检索请求合并为一次 retrieve_batch 调用。"""
+
+    # 攒批等待时间（秒）与单批最多查询数
+    _WINDOW = 0.005
+    _MAX_BATCH = 32
+
+    def __init__(self, retriever: Retriever):
+        self.retriever = retriever
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # 保存在途批次的引用，避免任务被回收
+        self._inflight: Set[asyncio.Task] = set()
+
+    async def submit(self, query: str) -> List[RetrievalResult]:
+        if self._worker is None or self._worker.done():
+            # 队列与后台任务绑定到当前事件循环，首次调用时再创建
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._collect())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((query, future))
+        return await future
+
+    async def _collect(self) -> None:
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            # 队列未攒满一批时等待一个窗口，让同时到达的请求并入本批
+            if queue.qsize() < self._MAX_BATCH - 1:
+                await asyncio.sleep(self._WINDOW)
+            while len(batch) < self._MAX_BATCH and not queue.empty():
+                batch.append(queue.get_nowait())
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(
+                _retrieval_pool(), self.retriever.retrieve_batch, [query for query, _ in batch]
+            )
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), hits in zip(batch, results):
+            # 等待方可能已被取消，跳过已完成的 future
+            if not future.done():
+                future.set_result(hits)
@@ -82,6 +82,7 @@ class MetricsRecord(BaseModel):
     query: str
     latency_ms: float
     retrieval_ms: float
+    rerank_ms: float = 0.0
     generation_ms: float
     retrieved_k: int
     timestamp: datetime
@@ -1,13 +1,14 @@
 from __future__ import annotations
 
 import json
+import threading
 from dataclasses import replace
 from datetime import datetime
 from pathlib import Path
 from typing import Dict
 import asyncio
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, ORJSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
@@ -28,6 +29,18 @@ from .schemas import (
 logger = get_logger(__name__)
 from fastapi.middleware.cors import CORSMiddleware
 
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - 未安装时回退到标准库
+    orjson = None  # type: ignore
+
+
+def _dumps_line(record: dict) -> bytes:
+    """序列化为一行 UTF-8 JSON（含换行符）。"""
+    if orjson is not None:
+        return orjson.dumps(record, default=str, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
 
 def create_app() -> FastAPI:
     """创建 FastAPI 应用并注册路由。"""
@@ -86,7 +99,13 @@ def create_app() -> FastAPI:
         settings=settings,
     )
 
-    app = FastAPI(title="RAG QA Service", version="1.0.0")
+    # ORJSONResponse 依赖 orjson，未安装时沿用默认的 JSONResponse
+    json_response_class = ORJSONResponse if orjson is not None else JSONResponse
+    app = FastAPI(
+        title="RAG QA Service",
+        version="1.0.0",
+        default_response_class=json_response_class,
+    )
 
     templates_dir = Path("templates")
     if templates_dir.exists():
@@ -99,6 +118,17 @@ def create_app() -> FastAPI:
         app.mount("/static", StaticFiles(directory=str(static_dir)), name="static")
 
     feedback_path = settings.storage_dir / "feedback.jsonl"
+    # 追加写超过 PIPE_BUF 时不保证原子性，串行化写入以免并发反馈的行相互交错
+    feedback_lock = threading.Lock()
+
+    def _append_feedback(line: bytes) -> None:
+        with feedback_lock:
+            feedback_path.parent.mkdir(parents=True, exist_ok=True)
+            with feedback_path.open("ab", buffering=1 << 16) as f:
+                f.write(line)
+
+    # 后台预加载线程与请求可能同时初始化同一检索器，构建过程需串行
+    pipelines_lock = threading.Lock()
 
     def get_pipeline(variant: str) -> RAGPipeline:
         meta = variant_metadata.get(variant)
@@ -116,36 +146,60 @@ def create_app() -> FastAPI:
         if settings_obj is None:
             raise HTTPException(status_code=404, detail=f"未知的检索器: {variant}")
 
-        try:
-            pipeline = RAGPipeline(settings_obj)
-        except Exception as exc:  # pragma: no cover - runtime guard
-            logger.exception("Failed to initialise pipeline '%s': %s", variant, exc)
-            raise HTTPException(
-                status_code=500,
-                detail=f"初始化检索器 '{variant}' 失败: {exc}",
-            ) from exc
-
-        pipelines[variant] = pipeline
+        with pipelines_lock:
+            pipeline = pipelines.get(variant)
+            if pipeline is not None:
+                return pipeline
+            try:
+                pipeline = RAGPipeline(settings_obj)
+            except Exception as exc:  # pragma: no cover - runtime guard
+                logger.exception("Failed to initialise pipeline '%s': %s", variant, exc)
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"初始化检索器 '{variant}' 失败: {exc}",
+                ) from exc
+            pipelines[variant] = pipeline
         return pipeline
 
+    async def resolve_pipeline(variant: str) -> RAGPipeline:
+        """在异步路由中获取检索器；尚未构建时在线程中初始化，避免阻塞事件循环。"""
+        pipeline = pipelines.get(variant)
+        if pipeline is not None:
+            return pipeline
+        return await asyncio.to_thread(get_pipeline, variant)
+
     primary_pipeline = get_pipeline("faiss")
 
-    # ✅ 预加载模型（修正版）
-    logger.info("🔄 预加载模型中...")
-    try:
-        # 触发 embedding 模型加载
+    def _warmup() -> None:
+        # 触发 embedding 模型与 FAISS 索引加载；索引尚未构建时忽略错误
         _ = primary_pipeline.embedding_service.model
-
-        # 触发 FAISS 索引加载（通过执行一次假查询）
-        # 不要直接访问 .index 属性，而是调用方法
         try:
             primary_pipeline.vector_store.similarity_search_with_score("预热查询", k=1)
         except Exception:
-            pass  # 索引可能为空，忽略错误
+            pass
 
-        logger.info("✅ 模型预加载完成")
-    except Exception as e:
-        logger.error(f"❌ 模型预加载失败: {e}")
+    async def _run_warmup() -> None:
+        try:
+            await asyncio.to_thread(_warmup)
+            logger.info("✅ 模型预加载完成")
+        except Exception as e:
+            logger.error(f"❌ 模型预加载失败: {e}")
+
+    @app.on_event("startup")
+    async def _start_warmup() -> None:
+        # 预热放到后台执行，不阻塞应用启动；保存引用以免任务被回收
+        logger.info("🔄 后台预加载模型中...")
+        app.state.warmup_task = asyncio.create_task(_run_warmup())
+        if colbert_available:
+            app.state.colbert_preload_task = asyncio.create_task(_preload_colbert())
+
+    async def _preload_colbert() -> None:
+        # ColBERT 模型在构造 pipeline 时下载并加载，提前完成后首个精排请求只需检索与重排
+        try:
+            await asyncio.to_thread(get_pipeline, "colbert")
+            logger.info("✅ ColBERT 检索器预加载完成")
+        except Exception as e:
+            logger.error(f"❌ ColBERT 检索器预加载失败: {e}")
 
 
     @app.get("/", response_class=HTMLResponse)
@@ -198,14 +252,10 @@ def create_app() -> FastAPI:
     @app.post("/ask/{variant}", response_model=AskResponse, name="ask_variant")
     async def ask(variant: str, request: AskRequest):
         """问答接口,调用完整 RAG 流程。"""
-        pipeline = get_pipeline(variant)
+        pipeline = await resolve_pipeline(variant)
         try:
-            # ✅ 将同步操作放到线程池执行，避免阻塞事件循环
-            answer = await asyncio.to_thread(
-                pipeline.answer,
-                request.query,
-                top_k=request.top_k
-            )
+            # 检索经合并器与并发请求攒批，重排与生成在线程池执行，不阻塞事件循环
+            answer = await pipeline.aanswer(request.query, top_k=request.top_k)
             evaluation_payload = None
             if request.evaluate:
                 contexts_texts = [ctx.get("text", "") for ctx in answer.contexts]
@@ -235,7 +285,7 @@ def create_app() -> FastAPI:
                         "error": str(eval_exc),
                         "diagnosis": [],
                     }
-            return AskResponse(
+            response = AskResponse(
                 answer=answer.answer,
                 citations=answer.citations,
                 contexts=answer.contexts,
@@ -243,6 +293,8 @@ def create_app() -> FastAPI:
                 timestamp=answer.timestamp,
                 evaluation=evaluation_payload,
             )
+            # 已校验过的模型直接由 pydantic-core 序列化，跳过 FastAPI 的二次校验与编码
+            return Response(content=response.model_dump_json(), media_type="application/json")
         except Exception as exc:
             logger.exception("Failed to answer query: %s", exc)
             raise HTTPException(status_code=500, detail=str(exc)) from exc
@@ -252,29 +304,22 @@ def create_app() -> FastAPI:
         """记录用户反馈，写入本地 JSONL 文件。"""
         record = request.model_dump()
         record["timestamp"] = datetime.utcnow().isoformat()
-        feedback_path.parent.mkdir(parents=True, exist_ok=True)
-        with feedback_path.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        # 文件 I/O 放到线程池执行，避免磁盘繁忙时阻塞事件循环
+        await asyncio.to_thread(_append_feedback, _dumps_line(record))
         return {"status": "ok"}
 
     @app.get("/metrics/{variant}", response_model=MetricsResponse, name="metrics_variant")
-    async def metrics(variant: str):
+    async def metrics(variant: str) -> Response:
         """返回近期性能指标列表与聚合数据。"""
-        pipeline = get_pipeline(variant)
-        aggregates = pipeline.metrics.aggregates()
-        records = [
-            {
-                "query": record.get("query", ""),
-                "latency_ms": record.get("latency_ms", 0.0),
-                "retrieval_ms": record.get("retrieval_ms", 0.0),
-                "generation_ms": record.get("generation_ms", 0.0),
-                "retrieved_k": record.get("retrieved_k", 0),
-                "timestamp": record.get("timestamp", ""),
-                "status": record.get("status", "unknown"),
+        pipeline = await resolve_pipeline(variant)
+        # 记录由 MetricsCollector.recent 按 MetricsRecord 的字段生成，结构可信，
+        # 直接编码返回，不再逐条重建字典并经 pydantic 校验；response_model 仅用于文档
+        return json_response_class(
+            content={
+                "aggregates": pipeline.metrics.aggregates(),
+                "records": pipeline.metrics.recent(),
             }
-            for record in pipeline.metrics.recent()
-        ]
-        return MetricsResponse(aggregates=aggregates, records=records)
+        )
 
     @app.get("/health")
     async def health():
@@ -307,7 +352,7 @@ def create_app() -> FastAPI:
     @app.get("/ragas/{variant}/results")
     async def ragas_results(variant: str):
         """读取指定检索器的最新 RAGAS 评估结果。"""
-        _ = get_pipeline(variant)
+        _ = await resolve_pipeline(variant)
         cached = await asyncio.to_thread(ragas_manager.load_cached, variant)
         if cached is None:
             raise HTTPException(status_code=404, detail="尚未生成评估结果")
@@ -316,7 +361,7 @@ def create_app() -> FastAPI:
     @app.post("/ragas/{variant}/run")
     async def ragas_run(variant: str):
         """触发一次 RAGAS 评估。"""
-        pipeline = get_pipeline(variant)
+        pipeline = await resolve_pipeline(variant)
         try:
             result = await asyncio.to_thread(ragas_manager.run, pipeline, variant=variant)
         except RuntimeError as exc:
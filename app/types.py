@@ -14,7 +14,7 @@ class RawDocument:
     metadata: Dict[str, Any] = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(slots=True)
 class DocumentChunk:
     """分块后的文档片段，用于向量化与检索。"""
     doc_id: str
@@ -25,7 +25,7 @@ class DocumentChunk:
     metadata: Dict[str, Any] = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(slots=True)
 class RetrievalResult:
     """检索结果，包含片段与相似度得分。"""
     chunk: DocumentChunk
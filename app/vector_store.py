@@ -1,11 +1,17 @@
 from __future__ import annotations
 
+import functools
+import itertools
 import json
+import operator
+import pickle
+import threading
 from pathlib import Path
-from typing import Iterable, List, Optional
+from typing import Iterable, Iterator, List, Optional
 
 import numpy as np
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain_core.documents import Document
 
 from .embedding_service import EmbeddingService
@@ -14,6 +20,31 @@ from .types import DocumentChunk
 
 logger = get_logger(__name__)
 
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - 未安装时回退到标准库
+    orjson = None  # type: ignore
+
+# 流式构建索引时每批送入 embedding 的分块数
+EMBED_STREAM_BATCH = 256
+
+# attrgetter 在 C 层一次取出多个字段，省去逐个属性访问的字节码
+_chunk_text = operator.attrgetter("text")
+_chunk_fields = operator.attrgetter("doc_id", "chunk_id", "start_index", "end_index", "metadata")
+
+# 与索引同目录保存的语料指纹，记录构建时的语料哈希、索引类型与相似度度量
+CORPUS_HASH_FILE = "corpus_hash.json"
+
+# 可由 reconstruct_n 无损还原原始向量的索引类型
+_LOSSLESS_INDEX_TYPES = frozenset({"flat", "hnsw"})
+
+
+def _batched(items: Iterable[DocumentChunk], size: int) -> Iterator[List[DocumentChunk]]:
+    """按固定大小切分可迭代对象（兼容 Python 3.10，无 itertools.batched）。"""
+    iterator = iter(items)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
 
 class VectorStoreManager:
     """负责构建、保存与加载 FAISS 向量库，并提供检索接口。"""
@@ -24,62 +55,271 @@ class VectorStoreManager:
         index_path: Path,
         metadata_path: Path,
         embedding_service: EmbeddingService,
+        index_type: str = "flat",
+        ef_search: int = 64,
+        mmap: bool = False,
+        metric: str = "l2",
     ):
         self.index_path = index_path
         self.metadata_path = metadata_path
         self.embedding_service = embedding_service
+        self.index_type = index_type
+        self.ef_search = ef_search
+        self.mmap = mmap
+        if metric not in ("cosine", "l2"):
+            raise ValueError(f"Unsupported FAISS metric: {metric}")
+        self.metric = metric
         self._vector_store: Optional[FAISS] = None
+        # 后台预热与首个请求可能同时触发加载，加锁避免重复读取索引
+        self._load_lock = threading.Lock()
+        # 每次重建索引递增，检索缓存据此判断结果是否过期
+        self.version = 0
 
     def _ensure_vector_store(self) -> FAISS:
         """确保向量库已加载，如未初始化则从磁盘恢复。"""
         if self._vector_store is not None:
             return self._vector_store
 
+        with self._load_lock:
+            if self._vector_store is None:
+                self._load_vector_store()
+        return self._vector_store
+
+    def _load_vector_store(self) -> None:
         if self.index_path.exists() and self.metadata_path.exists():
+            # 没有指纹或指纹中缺少度量的旧索引均按 L2 构建
+            built_metric = self._read_fingerprint().get("metric", "l2")
+            if built_metric != self.metric:
+                raise RuntimeError(
+                    f"FAISS index at {self.index_path} was built with metric '{built_metric}', "
+                    f"but '{self.metric}' is configured. Re-run ingestion to rebuild the index."
+                )
             logger.info("Loading FAISS index from %s", self.index_path)
-            self._vector_store = FAISS.load_local(
-                str(self.index_path),
-                self.embedding_service.as_langchain_embedding(),
-                allow_dangerous_deserialization=True,
-            )
+            store = self._load_mmap() if self.mmap else None
+            if store is None:
+                store = FAISS.load_local(
+                    str(self.index_path),
+                    self.embedding_service.as_langchain_embedding(),
+                    allow_dangerous_deserialization=True,
+                    **self._faiss_kwargs(),
+                )
+            self._vector_store = store
+            self._configure_search(self._vector_store.index)
         else:
             raise RuntimeError(
                 "Vector store not initialised. Build the index before querying."
             )
-        return self._vector_store
 
-    def build_index(self, chunks: Iterable[DocumentChunk]) -> None:
-        """将分块后的文本向量化并写入 FAISS 索引。"""
-        docs: List[Document] = []
-
-        for chunk in chunks:
-            metadata = {
-                "doc_id": chunk.doc_id,
-                "chunk_id": chunk.chunk_id,
-                "source": chunk.metadata.get("source_path"),
-                "source_name": chunk.metadata.get("source_name"),
-                "start_index": chunk.start_index,
-                "end_index": chunk.end_index,
-            }
-            docs.append(Document(page_content=chunk.text, metadata=metadata))
-
-        logger.info("Embedding %s chunks for FAISS index", len(docs))
-        adapter = self.embedding_service.as_langchain_embedding()
+    def _load_mmap(self) -> Optional[FAISS]:
+        """以只读 mmap 方式打开索引，由内核按需换页；当前 faiss 不支持时返回 None。"""
+        import faiss
+
+        try:
+            index = faiss.read_index(
+                str(self.index_path / "index.faiss"),
+                faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY,
+            )
+            # 与 FAISS.save_local 写出的 index.pkl 格式一致
+            with (self.index_path / "index.pkl").open("rb") as f:
+                docstore, index_to_docstore_id = pickle.load(f)
+        except (RuntimeError, OSError) as exc:
+            logger.warning("mmap loading of FAISS index failed, reading into memory: %s", exc)
+            return None
+        return FAISS(
+            embedding_function=self.embedding_service.as_langchain_embedding(),
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=index_to_docstore_id,
+            **self._faiss_kwargs(),
+        )
+
+    def _faiss_kwargs(self) -> dict:
+        """cosine 度量下使用内积索引，并由 LangChain 归一化写入与查询的向量。"""
+        if self.metric == "cosine":
+            return {"distance_strategy": DistanceStrategy.MAX_INNER_PRODUCT, "normalize_L2": True}
+        return {"distance_strategy": DistanceStrategy.EUCLIDEAN_DISTANCE}
+
+    def _faiss_metric(self):
+        import faiss
+
+        return faiss.METRIC_INNER_PRODUCT if self.metric == "cosine" else faiss.METRIC_L2
+
+    def build_index(
+        self, chunks: Iterable[DocumentChunk], *, corpus_hash: Optional[str] = None
+    ) -> int:
+        """将分块后的文本向量化并写入 FAISS 索引，返回写入的向量数。
+
+        分块按批流式编码，上游可传入生成器而无需先物化全部分块。
+        传入 ``corpus_hash`` 时一并保存，供 :meth:`reindex` 判断能否复用已有向量。
+        """
+        texts: List[str] = []
+        metadatas: List[dict] = []
+        vectors: List[np.ndarray] = []
+
+        for batch in _batched(chunks, EMBED_STREAM_BATCH):
+            batch_texts = list(map(_chunk_text, batch))
+            vectors.append(self.embedding_service.embed_texts(batch_texts))
+            texts.extend(batch_texts)
+            metadatas.extend(
+                {
+                    "doc_id": doc_id,
+                    "chunk_id": chunk_id,
+                    "source": metadata.get("source_path"),
+                    "source_name": metadata.get("source_name"),
+                    "start_index": start_index,
+                    "end_index": end_index,
+                }
+                for doc_id, chunk_id, start_index, end_index, metadata in map(
+                    _chunk_fields, batch
+                )
+            )
+            logger.info("Embedded %s chunks for FAISS index", len(texts))
+
+        if not texts:
+            return 0
+
+        matrix = np.ascontiguousarray(np.vstack(vectors), dtype=np.float32)
+        if self.metric == "cosine":
+            # 入库前统一归一化，内积即余弦相似度；ANN 索引与 docstore 共用这份向量
+            import faiss
 
-        index = FAISS.from_documents(
-            documents=docs,
+            faiss.normalize_L2(matrix)
+        adapter = self.embedding_service.as_langchain_embedding()
+        index = FAISS.from_embeddings(
+            text_embeddings=zip(texts, matrix),
             embedding=adapter,
+            metadatas=metadatas,
+            **self._faiss_kwargs(),
         )
+        # 向量按相同顺序写入近似索引，docstore 的位置映射保持不变
+        ann_index = self._build_ann_index(matrix)
+        if ann_index is not None:
+            index.index = ann_index
 
         self.index_path.parent.mkdir(parents=True, exist_ok=True)
         index.save_local(str(self.index_path))
 
-        with self.metadata_path.open("w", encoding="utf-8") as f:
-            for doc in docs:
-                f.write(json.dumps(doc.metadata, ensure_ascii=False) + "\n")
+        # 先在内存中拼好全部行再一次写出，避免逐行的小块 write 调用
+        if orjson is not None:
+            dumps = functools.partial(orjson.dumps, option=orjson.OPT_APPEND_NEWLINE)
+            payload = b"".join(map(dumps, metadatas))
+        else:
+            payload = "".join(
+                json.dumps(metadata, ensure_ascii=False) + "\n" for metadata in metadatas
+            ).encode("utf-8")
+        self.metadata_path.write_bytes(payload)
+        self._write_fingerprint(corpus_hash)
 
         self._vector_store = index
-        logger.info("Persisted FAISS index with %s vectors", len(docs))
+        self.version += 1
+        logger.info("Persisted FAISS index with %s vectors", len(texts))
+        return len(texts)
+
+    def reindex(self, corpus_hash: str) -> Optional[int]:
+        """语料未变时复用已保存的向量，仅按当前 index_type 重建索引结构。
+
+        无法复用（语料变化、无指纹或原索引为有损量化）时返回 None，由调用方完整构建。
+        """
+        fingerprint = self._read_fingerprint()
+        previous_type = fingerprint.get("index_type")
+        if (
+            fingerprint.get("corpus_hash") != corpus_hash
+            or fingerprint.get("metric", "l2") != self.metric
+            or previous_type not in _LOSSLESS_INDEX_TYPES
+        ):
+            return None
+        try:
+            store = self._ensure_vector_store()
+        except RuntimeError:
+            return None
+
+        count = store.index.ntotal
+        if previous_type == self.index_type.lower():
+            logger.info("Corpus unchanged, reusing FAISS index with %s vectors", count)
+            return count
+
+        # 跳过分块、向量化与元数据写出，直接从原索引取回向量重建
+        matrix = store.index.reconstruct_n(0, count)
+        ann_index = self._build_ann_index(matrix)
+        if ann_index is None:
+            import faiss
+
+            ann_index = faiss.IndexFlat(matrix.shape[1], self._faiss_metric())
+            ann_index.add(matrix)
+        store.index = ann_index
+        store.save_local(str(self.index_path))
+        self._write_fingerprint(corpus_hash)
+        self.version += 1
+        logger.info(
+            "Corpus unchanged, rebuilt %s FAISS index from %s stored vectors",
+            self.index_type,
+            count,
+        )
+        return count
+
+    def _read_fingerprint(self) -> dict:
+        try:
+            fingerprint = json.loads(
+                (self.index_path / CORPUS_HASH_FILE).read_text(encoding="utf-8")
+            )
+        except (OSError, ValueError):
+            return {}
+        return fingerprint if isinstance(fingerprint, dict) else {}
+
+    def _write_fingerprint(self, corpus_hash: Optional[str]) -> None:
+        # 未提供语料哈希时也写入度量，加载时据此发现与配置不一致的索引
+        (self.index_path / CORPUS_HASH_FILE).write_text(
+            json.dumps(
+                {
+                    "corpus_hash": corpus_hash,
+                    "index_type": self.index_type.lower(),
+                    "metric": self.metric,
+                }
+            ),
+            encoding="utf-8",
+        )
+
+    def _build_ann_index(self, matrix: np.ndarray):
+        """按 index_type 构建 HNSW、SQ8 或 IVF-PQ 索引；flat 或数据量不足时返回 None。"""
+        index_type = self.index_type.lower()
+        if index_type == "flat":
+            return None
+        import faiss
+
+        count, dim = matrix.shape
+        metric = self._faiss_metric()
+        if index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dim, 32, metric)
+            index.hnsw.efConstruction = 200
+        elif index_type == "sq8":
+            # 每维以 int8 存储，按维度训练取值范围
+            index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, metric)
+            index.train(matrix)
+        elif index_type == "ivfpq":
+            # 每个聚类中心至少需要约 39 个训练样本，PQ 子空间数需整除维度
+            nlist = min(4096, count // 39)
+            m = next((m for m in (dim // 4, 64, 32, 16, 8) if m and dim % m == 0), 0)
+            if nlist < 1 or not m or count < 256:
+                logger.warning(
+                    "Too few vectors (%s) for IVF-PQ, keeping the flat FAISS index", count
+                )
+                return None
+            quantizer = faiss.IndexFlat(dim, metric)
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, m, 8, metric)
+            index.train(matrix)
+        else:
+            raise ValueError(f"Unsupported FAISS index type: {self.index_type}")
+        index.add(matrix)
+        self._configure_search(index)
+        logger.info("Built %s FAISS index over %s vectors", index_type, count)
+        return index
+
+    def _configure_search(self, index) -> None:
+        """设置查询期参数（HNSW 的 efSearch、IVF 的 nprobe）。"""
+        if hasattr(index, "hnsw"):
+            index.hnsw.efSearch = self.ef_search
+        elif hasattr(index, "nprobe"):
+            index.nprobe = max(1, self.ef_search // 4)
 
     def similarity_search(self, query: str, k: int) -> List[Document]:
         """执行相似度检索，返回文档列表。"""
@@ -90,3 +330,46 @@ class VectorStoreManager:
     ) -> List[tuple[Document, float]]:
         """执行检索并同时返回相似度分数。"""
         return self._ensure_vector_store().similarity_search_with_score(query, k=k)
+
+    def similarity_search_by_vector_with_score(
+        self, embedding: np.ndarray, k: int
+    ) -> List[tuple[Document, float]]:
+        """使用已计算好的查询向量检索，避免重复编码。"""
+        return self._ensure_vector_store().similarity_search_with_score_by_vector(
+            embedding, k=k
+        )
+
+    def similarity_search_batch(
+        self, queries: List[str], k: int
+    ) -> List[List[tuple[Document, float]]]:
+        """一次编码全部查询并调用 FAISS 批量检索，返回与 queries 对应的结果列表。"""
+        if not queries:
+            return []
+        return self.similarity_search_batch_by_vectors(
+            self.embedding_service.embed_texts(queries), k
+        )
+
+    def similarity_search_batch_by_vectors(
+        self, embeddings: np.ndarray, k: int
+    ) -> List[List[tuple[Document, float]]]:
+        """使用已编码的查询矩阵（每行一条查询）执行一次 FAISS 批量检索。"""
+        if not len(embeddings):
+            return []
+        store = self._ensure_vector_store()
+        xq = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if getattr(store, "_normalize_L2", False):
+            xq = xq / np.maximum(np.linalg.norm(xq, axis=1, keepdims=True), 1e-12)
+        distances, indices = store.index.search(xq, k)
+
+        results: List[List[tuple[Document, float]]] = []
+        for row_distances, row_indices in zip(distances.tolist(), indices.tolist()):
+            hits: List[tuple[Document, float]] = []
+            for distance, idx in zip(row_distances, row_indices):
+                # FAISS 以 -1 填充不足 k 个的结果
+                if idx == -1:
+                    continue
+                doc = store.docstore.search(store.index_to_docstore_id[idx])
+                if isinstance(doc, Document):
+                    hits.append((doc, distance))
+            results.append(hits)
+        return results
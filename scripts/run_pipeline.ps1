@@ -49,5 +49,5 @@ if ($Ingest) {
 }
 
 if ($Serve) {
-    & $PythonExe -m uvicorn app.server:app --host $BindHost --port $BindPort
+    & $PythonExe -m uvicorn app.server:app --host $BindHost --port $BindPort --http httptools
 }